@@ -1,17 +1,64 @@
-""" CLI program that lets you add chords you've learned to your file """
-from chorddata import ChordData
-import os
+""" CLI program that lets you add chords you've learned to your file
+
+    Usage:
+        python addchords.py mychords.txt A Bm C7
+        python addchords.py mychords.txt --file chords.txt
+        cat chords.txt | python addchords.py mychords.txt --file - --dry-run
+
+    Chord files have any number of chords per line separated by spaces or commas.
+    Everything after a # on a line is ignored.
+"""
+import argparse
+import re
 import sys
 
-if len(sys.argv) > 1:
-    with ChordData(sys.argv[1]) as cd:
-        passed = []
-        failed = []
-
-        for chord in sys.argv[2:]:
-            if cd.add_chord(chord):
-                passed.append(chord)
-            else:
-                failed.append(chord)
-    print("Added", passed)
-    print("Could not add", failed)
+from chorddata import ChordData
+
+_separators = re.compile(r"[\s,]+")
+
+
+def read_chords(lines):
+    """ Yields the chords in an iterable of lines one at a time """
+    for line in lines:
+        for chord in _separators.split(line.split("#", 1)[0]):
+            if chord:
+                yield chord
+
+
+def chord_sources(chords, files):
+    """ Yields the chords given on the command line and then the ones in each file (- is stdin) """
+    yield from chords
+    for file in files:
+        if file == "-":
+            yield from read_chords(sys.stdin)
+        else:
+            with open(file) as chord_file:
+                yield from read_chords(chord_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add chords you've learned to your save file")
+    parser.add_argument("save_file")
+    parser.add_argument("chords", nargs="*")
+    parser.add_argument("-f", "--file", action="append", default=[], help="read chords from a file, - for stdin")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only print what would be added")
+    args = parser.parse_args()
+
+    chords = chord_sources(args.chords, args.file)
+    if args.dry_run:
+        cd = ChordData(args.save_file)
+        added, known, invalid = cd.classify_chords(chords)
+        old = len(cd.chords)
+        new_pairs = old * len(added) + len(added) * (len(added) - 1) // 2
+        print(f"Would add {len(added)} chords and {new_pairs} chord pairs to the {old} chords in {cd.file}")
+        print("New", added)
+    else:
+        with ChordData(args.save_file) as cd:
+            added, known, invalid = cd.add_chords(chords)
+        print("Added", added)
+    print("Already known", known)
+    print("Could not add", invalid)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+    Statistics across a whole directory of profiles.
+
+    Every profile is loaded and boiled down to a small summary in a separate
+    process (ProcessPoolExecutor), and the summaries are merged in this one:
+
+        leaderboard   the best players of every chord pair by high score
+        cohorts       players grouped by the month of their first session, with
+                      their average score for each week since they started
+        hardest       the pairs with the lowest average high score across players
+
+    A line per profile is written to profiles.csv / profiles.jsonl as soon as
+    that profile is done, and the three tables are written at the end.
+
+    Progress is saved to checkpoint.json in the output directory every so
+    often, so running the same command again after it was interrupted skips
+    the profiles that were already done.
+
+    Usage:
+        python analytics.py profiles/ results/ --format jsonl --workers 8
+"""
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import csv
+from datetime import datetime
+import glob
+import heapq
+import json
+import os
+import sys
+import time
+
+WEEK = 7 * 24 * 60 * 60
+CHECKPOINT = "checkpoint.json"
+PROFILE_FIELDS = ["player", "file", "chords", "pairs_played", "sessions", "first", "last", "error"]
+PATTERNS = ("*.txt", "*.gsb")
+
+
+def profile_id(file):
+    """ Identifies a profile file and the version of it that was read """
+    stat = os.stat(file)
+    return f"{os.path.abspath(file)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def reduce_profile(file):
+    """
+        Runs in a worker process. Loads one profile and returns what the
+        aggregates need from it, so only a small dict goes back to the main process.
+    """
+    from chorddata import ChordData
+    player = os.path.splitext(os.path.basename(file))[0]
+    # If the file is gone its error row still needs an id, the path will do
+    summary = {"player": player, "file": file, "id": os.path.abspath(file)}
+    try:
+        summary["id"] = profile_id(file)
+        data = ChordData(os.path.abspath(file))
+        pairs = {}
+        first, last, sessions = None, None, 0
+        for pair in data.scores:
+            stats = data.stats(pair)
+            if stats.count == 0:
+                continue
+            pairs["&".join(pair)] = [stats.high, stats.count]
+            sessions += stats.count
+            first = stats.first if first is None else min(first, stats.first)
+            last = stats.last if last is None else max(last, stats.last)
+        weeks = {}
+        if first is not None:
+            for history in data.scores.values():
+                for timestamp, score in history.items():
+                    cell = weeks.setdefault(int((timestamp - first) // WEEK), [0, 0])
+                    cell[0] += score
+                    cell[1] += 1
+        summary.update(chords=len(data.chords), pairs=pairs, sessions=sessions, first=first, last=last, weeks=weeks)
+    except Exception as error:
+        summary["error"] = f"{type(error).__name__}: {error}"
+    return summary
+
+
+class Aggregates:
+    """ The merged results so far. Everything in it can be saved as JSON for the checkpoint """
+
+    def __init__(self, top=10):
+        self.top = top
+        # pair -> heap of [high, player] with the lowest of the top players first.
+        # Ties go to the player whose name sorts last, so the order the profiles
+        # finish in doesn't change who is on the board.
+        self.leaderboard = {}
+        # pair -> [sum of high scores, players, sessions]
+        self.pairs = {}
+        # cohort month -> week -> [sum of scores, sessions, players]
+        self.cohorts = {}
+
+    def merge(self, summary):
+        player = summary["player"]
+        for pair, (high, count) in summary["pairs"].items():
+            board = self.leaderboard.setdefault(pair, [])
+            if len(board) < self.top:
+                heapq.heappush(board, [high, player])
+            elif [high, player] > board[0]:
+                heapq.heapreplace(board, [high, player])
+            totals = self.pairs.setdefault(pair, [0, 0, 0])
+            totals[0] += high
+            totals[1] += 1
+            totals[2] += count
+        if summary["first"] is not None:
+            cohort = self.cohorts.setdefault(datetime.fromtimestamp(summary["first"]).strftime("%Y-%m"), {})
+            for week, (total, count) in summary["weeks"].items():
+                cell = cohort.setdefault(str(week), [0, 0, 0])
+                cell[0] += total
+                cell[1] += count
+                cell[2] += 1
+
+    def state(self):
+        return {"top": self.top, "leaderboard": self.leaderboard, "pairs": self.pairs, "cohorts": self.cohorts}
+
+    @classmethod
+    def from_state(cls, state):
+        aggregates = cls(state["top"])
+        aggregates.leaderboard = state["leaderboard"]
+        aggregates.pairs = state["pairs"]
+        aggregates.cohorts = state["cohorts"]
+        return aggregates
+
+    def leaderboard_rows(self):
+        for pair in sorted(self.leaderboard):
+            for rank, (high, player) in enumerate(sorted(self.leaderboard[pair], reverse=True), 1):
+                yield {"pair": pair, "rank": rank, "player": player, "high": high}
+
+    def cohort_rows(self):
+        for cohort in sorted(self.cohorts):
+            for week in sorted(self.cohorts[cohort], key=int):
+                total, count, players = self.cohorts[cohort][week]
+                yield {"cohort": cohort, "week": int(week), "players": players, "sessions": count, "mean": total / count}
+
+    def hardest_rows(self, min_players=1, limit=100):
+        rows = [
+            {"pair": pair, "players": players, "sessions": sessions, "mean_high": total / players}
+            for pair, (total, players, sessions) in self.pairs.items() if players >= min_players
+        ]
+        rows.sort(key=lambda row: (row["mean_high"], -row["players"], row["pair"]))
+        return rows[:limit]
+
+
+class RowWriter:
+    """ Writes dict rows as CSV or JSON lines, one at a time """
+
+    def __init__(self, file, fields, format, append=False):
+        self.format = format
+        self.fields = fields
+        self.handle = open(file, "a" if append else "w", newline="")
+        if format == "csv":
+            self.writer = csv.DictWriter(self.handle, fields, extrasaction="ignore")
+            if self.handle.tell() == 0:
+                self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == "csv":
+            self.writer.writerow(row)
+        else:
+            self.handle.write(json.dumps({field: row.get(field) for field in self.fields}) + "\n")
+
+    def close(self):
+        self.handle.close()
+
+
+def write_table(file, fields, format, rows):
+    writer = RowWriter(file, fields, format)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+
+
+def load_checkpoint(file):
+    try:
+        with open(file) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(file, done, aggregates, rows_offset, format):
+    temp_file = file + ".tmp"
+    with open(temp_file, "w") as checkpoint_file:
+        json.dump({"done": sorted(done), "aggregates": aggregates.state(),
+                   "rows_offset": rows_offset, "format": format}, checkpoint_file)
+    os.replace(temp_file, file)
+
+
+def run(directory, output, format="csv", workers=None, top=10, min_players=1, limit=100,
+        checkpoint_every=100, restart=False):
+    os.makedirs(output, exist_ok=True)
+    checkpoint_file = os.path.join(output, CHECKPOINT)
+    rows_file = os.path.join(output, f"profiles.{format}")
+    checkpoint = None if restart else load_checkpoint(checkpoint_file)
+    if checkpoint is not None and checkpoint["format"] != format:
+        raise SystemExit(f"{output} was started with --format {checkpoint['format']}, use that or --restart")
+
+    if checkpoint is not None:
+        # truncate would pad a missing or shorter file with NUL bytes up to the offset
+        if not os.path.exists(rows_file) or os.path.getsize(rows_file) < checkpoint["rows_offset"]:
+            raise SystemExit(f"{rows_file} is missing or shorter than the checkpoint says, use --restart")
+        done = set(checkpoint["done"])
+        aggregates = Aggregates.from_state(checkpoint["aggregates"])
+        # Rows written after the last checkpoint are for profiles that will be done again
+        with open(rows_file, "a") as rows:
+            rows.truncate(checkpoint["rows_offset"])
+    else:
+        done = set()
+        aggregates = Aggregates(top)
+        if os.path.exists(rows_file):
+            os.remove(rows_file)
+
+    files = sorted({file for pattern in PATTERNS for file in glob.glob(os.path.join(directory, pattern))})
+    todo = []
+    for file in files:
+        try:
+            if profile_id(file) in done:
+                continue
+        except OSError:
+            # Deleted or renamed since the glob, the worker reports it as an error row
+            pass
+        todo.append(file)
+    print(f"{len(files)} profiles, {len(files) - len(todo)} already done", file=sys.stderr)
+
+    rows = RowWriter(rows_file, PROFILE_FIELDS, format, append=True)
+    start = time.perf_counter()
+    finished = 0
+    # Only keep a few profiles per worker queued so results stream out steadily
+    window = 4 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        queue = iter(todo)
+        # The checkpoint is only saved between profiles. If this is interrupted the
+        # profiles since the last one are simply done again on the next run.
+        try:
+            while True:
+                for file in queue:
+                    pending.add(executor.submit(reduce_profile, file))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    break
+                completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    summary = future.result()
+                    if "error" not in summary:
+                        aggregates.merge(summary)
+                        summary["pairs_played"] = len(summary["pairs"])
+                    rows.write(summary)
+                    done.add(summary["id"])
+                    finished += 1
+                    if finished % checkpoint_every == 0:
+                        rows.handle.flush()
+                        save_checkpoint(checkpoint_file, done, aggregates, rows.handle.tell(), format)
+                        print(f"{finished}/{len(todo)} profiles, {finished / (time.perf_counter() - start):.1f}/s",
+                              file=sys.stderr)
+            rows.handle.flush()
+            save_checkpoint(checkpoint_file, done, aggregates, rows.handle.tell(), format)
+        finally:
+            rows.close()
+
+    write_table(os.path.join(output, f"leaderboard.{format}"), ["pair", "rank", "player", "high"],
+                format, aggregates.leaderboard_rows())
+    write_table(os.path.join(output, f"cohorts.{format}"), ["cohort", "week", "players", "sessions", "mean"],
+                format, aggregates.cohort_rows())
+    write_table(os.path.join(output, f"hardest.{format}"), ["pair", "players", "sessions", "mean_high"],
+                format, aggregates.hardest_rows(min_players, limit))
+    print(f"Done, {finished} profiles in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leaderboards, cohort curves and the hardest pairs across many profiles")
+    parser.add_argument("directory", help="directory of profile files (*.txt and *.gsb)")
+    parser.add_argument("output", help="directory for the results and the checkpoint")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: one per CPU)")
+    parser.add_argument("--top", type=int, default=10, help="players per pair on the leaderboard")
+    parser.add_argument("--min-players", type=int, default=1, help="players a pair needs to count as one of the hardest")
+    parser.add_argument("--limit", type=int, default=100, help="number of hardest pairs to list")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="profiles between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+    run(args.directory, args.output, args.format, args.workers, args.top, args.min_players, args.limit,
+        args.checkpoint_every, args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+    Saves a ChordData object in the background while the program is running.
+
+    ChordData only saves when its with block ends, so without this a crash
+    loses the whole practice session (unless journal mode is on), and saving
+    after every score would stall the GUI on rewriting the whole file.
+
+    AutoSaver listens for changes and waits until they stop coming for a
+    couple of seconds, so a burst of scores is saved once. The save itself
+    runs on the AutoSaver's thread: it takes a snapshot of the data under
+    ChordData.lock, writes it to a temporary file and renames it over the
+    save file.
+
+    In journal mode every change is already on disk, so a full save after every
+    burst would only undo the point of the journal. Then the AutoSaver just keeps
+    the journal short: once it is past JOURNAL_COMPACT_AT of journal_limit it is
+    compacted in the background, before ChordData._log would have to do it on
+    the GUI thread.
+
+        with ChordData("mychords.txt") as data:
+            saver = AutoSaver(data)
+            ...
+            saver.close()  # stops the thread and saves anything that is left
+"""
+import sys
+import threading
+import time
+
+# Save once the data has not changed for this many seconds
+DELAY = 2.0
+# ... but never wait longer than this after the first unsaved change
+MAX_DELAY = 10.0
+# In journal mode, compact once the journal is this fraction of ChordData.journal_limit
+JOURNAL_COMPACT_AT = 0.5
+
+
+class AutoSaver(threading.Thread):
+    """
+        Thread that saves a ChordData object a little while after it changes.
+        It starts itself, call close() to stop it.
+    """
+
+    def __init__(self, data, delay=DELAY, max_delay=MAX_DELAY):
+        super(AutoSaver, self).__init__(name="autosave", daemon=True)
+        self.data = data
+        self.delay = delay
+        self.max_delay = max_delay
+        # The last error from saving in the background, if there was one
+        self.error = None
+        self._condition = threading.Condition()
+        self._first_change = None
+        self._last_change = None
+        self._stopping = False
+        data.add_listener(self.data_changed)
+        self.start()
+
+    def data_changed(self, event, *args):
+        """ ChordData listener. Only records the time, this runs on the GUI thread """
+        with self._condition:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self._condition.notify()
+
+    def run(self):
+        with self._condition:
+            while not self._stopping:
+                if self._first_change is None:
+                    self._condition.wait()
+                    continue
+                due = min(self._last_change + self.delay, self._first_change + self.max_delay)
+                now = time.monotonic()
+                if now < due:
+                    self._condition.wait(due - now)
+                    continue
+                self._first_change = self._last_change = None
+                # Let changes keep coming in while the file is written
+                self._condition.release()
+                try:
+                    self._save()
+                finally:
+                    self._condition.acquire()
+
+    def _needs_save(self):
+        if self.data.journal:
+            return self.data._journal_size() > self.data.journal_limit * JOURNAL_COMPACT_AT
+        return self.data.dirty
+
+    def _save(self):
+        try:
+            if self._needs_save():
+                self.data._save()
+        except OSError as error:
+            # Keep going, the next change will try again
+            self.error = error
+            print(f"Autosave to {self.data.file} failed: {error}", file=sys.stderr)
+
+    def flush(self):
+        """
+            Save right now on the calling thread if there are unsaved changes
+            (in journal mode, only if the journal is getting long)
+        """
+        with self._condition:
+            self._first_change = self._last_change = None
+        if self._needs_save():
+            self.data._save()
+
+    def close(self):
+        """ Stop the thread and save whatever it had not saved yet """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.join()
+        self.data.remove_listener(self.data_changed)
+        self.flush()
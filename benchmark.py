@@ -0,0 +1,221 @@
+"""
+    Benchmarks for ChordData on made up profiles.
+
+    A profile is generated with the given number of chords, sessions per pair
+    and time span, then each operation is timed (best and mean of --repeat runs)
+    and run once more under tracemalloc to get its peak memory.
+    The results are printed as JSON, or written to --output.
+
+    Usage:
+        python benchmark.py --chords 200 --sessions 10 --output before.json
+        python benchmark.py --chords 200 --sessions 10 --compare before.json
+    With --compare the exit status is 1 if anything got slower than --threshold times the old time.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import chordbin
+from chorddata import ChordData
+from chordnames import canonical_chords
+
+
+def chord_names(count):
+    """ Returns count different chord names that parse_chord accepts """
+    names = canonical_chords()
+    if count > len(names):
+        raise ValueError(f"Can only make {len(names)} different chords")
+    return names[:count]
+
+
+def generate_profile(file, chords=50, sessions=5, span_days=365, played=1.0, binary=False, seed=0):
+    """
+        Write a made up save file.
+
+        chords      number of chords, the profile has chords * (chords - 1) / 2 pairs
+        sessions    sessions per played pair
+        span_days   the sessions are spread over this many days up to now
+        played      fraction of the pairs that have been played at all
+        binary      write a chordbin snapshot instead of JSON
+    """
+    rng = random.Random(seed)
+    names = chord_names(chords)
+    end = time.time()
+    start = end - span_days * 86400
+    pairs = []
+    for i in range(1, chords):
+        for j in range(i):
+            if rng.random() >= played:
+                continue
+            times = sorted(rng.uniform(start, end) for _ in range(sessions))
+            # Scores go up over time like they would for a real person
+            history = {timestamp: max(0, int(10 + 40 * n / sessions + rng.gauss(0, 5))) for n, timestamp in enumerate(times)}
+            pairs.append((i, j, history))
+    if binary:
+        chordbin.write_snapshot(file, names, pairs)
+    else:
+        scores = {}
+        for i, j, history in pairs:
+            key = "&".join(sorted((names[i], names[j])))
+            scores[key] = history
+        with open(file, "w") as savefile:
+            json.dump([names, scores], savefile, indent=2)
+
+
+def measure(function, repeat, setup=None):
+    """
+        Time function repeat times and then run it once under tracemalloc.
+        setup is called before every run and its result is passed to function.
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    argument = setup() if setup else None
+    tracemalloc.start()
+    try:
+        function(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"best": min(times), "mean": sum(times) / len(times), "peak_bytes": peak}
+
+
+def run(chords=50, sessions=5, span_days=365, played=1.0, binary=False, draws=10000, repeat=5, seed=0):
+    """ Runs every benchmark and returns the results as a dict """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        profile = os.path.join(directory, "profile" + (chordbin.EXTENSION if binary else ".txt"))
+        generate_profile(profile, chords, sessions, span_days, played, binary, seed)
+        results["profile_bytes"] = os.path.getsize(profile)
+
+        def load(_):
+            return ChordData(profile)
+
+        data = load(None)
+        pairs = list(data.pairs())
+        results["pairs"] = len(pairs)
+        results["sessions"] = sum(len(history) for history in data.scores.values())
+        benchmarks = {}
+        benchmarks["load"] = measure(load, repeat)
+        copy = os.path.join(directory, "copy" + (chordbin.EXTENSION if binary else ".txt"))
+        benchmarks["save"] = measure(lambda _: data._save(copy), repeat)
+
+        names = chord_names(chords)
+
+        def empty_profile():
+            return ChordData(os.path.join(directory, "empty.txt"))
+
+        def add_chords(empty):
+            for name in names:
+                empty.add_chord(name)
+        benchmarks["add_chord"] = measure(add_chords, repeat, empty_profile)
+
+        rng = random.Random(seed)
+        new_scores = [(rng.choice(pairs), rng.randint(0, 60)) for _ in range(draws)]
+
+        def add_scores(_):
+            for pair, score in new_scores:
+                data.add_score(pair, score)
+        benchmarks["add_score"] = measure(add_scores, repeat)
+
+        def highscores(_):
+            for pair in pairs:
+                data.highscore(pair)
+        benchmarks["highscore_all"] = measure(highscores, repeat)
+
+        def avgscores(_):
+            for pair in pairs:
+                data.avgscore(pair)
+        benchmarks["avgscore_all"] = measure(avgscores, repeat)
+
+        def random_keys(_):
+            for _ in range(draws):
+                data.random_key()
+        benchmarks["random_key"] = measure(random_keys, repeat)
+
+        def first_weighted_random(fresh):
+            fresh.weighted_random()
+        # The first draw builds the sampler, after that draws are cheap
+        benchmarks["weighted_random_first"] = measure(first_weighted_random, repeat, lambda: load(None))
+
+        def weighted_randoms(_):
+            for _ in range(draws):
+                data.weighted_random()
+        benchmarks["weighted_random"] = measure(weighted_randoms, repeat)
+
+    return {
+        "parameters": {
+            "chords": chords, "sessions": sessions, "span_days": span_days, "played": played,
+            "binary": binary, "draws": draws, "repeat": repeat, "seed": seed,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "time": time.time(),
+        },
+        "profile": results,
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+        Prints how each benchmark changed since baseline.
+        Returns the names of the ones that got slower than threshold times the old best time.
+    """
+    slower = []
+    if baseline["parameters"] != results["parameters"]:
+        print("Warning: the baseline was run with different parameters", file=sys.stderr)
+    for name, result in results["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            continue
+        ratio = result["best"] / old["best"] if old["best"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            slower.append(name)
+            flag = "  SLOWER"
+        print(f"{name:<24}{old['best'] * 1000:>10.2f} ms{result['best'] * 1000:>10.2f} ms{ratio:>8.2f}x{flag}", file=sys.stderr)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChordData on a made up profile")
+    parser.add_argument("--chords", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=5, help="sessions per played pair")
+    parser.add_argument("--span-days", type=float, default=365)
+    parser.add_argument("--played", type=float, default=1.0, help="fraction of pairs that have sessions")
+    parser.add_argument("--binary", action="store_true", help="use a binary snapshot instead of JSON")
+    parser.add_argument("--draws", type=int, default=10000, help="calls per run for the per call benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results here instead of printing them")
+    parser.add_argument("--compare", help="JSON results from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    results = run(args.chords, args.sessions, args.span_days, args.played, args.binary,
+                  args.draws, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
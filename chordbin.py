@@ -0,0 +1,164 @@
+"""
+    Binary snapshot format for ChordData save files.
+
+    JSON with indent=2 and timestamps as strings is the slowest and biggest way
+    to store what is really just (pair, timestamp, score) records. A binary
+    snapshot is laid out like this (everything little endian):
+
+        header      magic "GSCD", version, chord count, pair count, session count
+        chords      for each chord: u16 length + utf-8 name
+        pairs       for each played pair: chord ids, where its sessions start,
+                    how many there are, and its high score / total / first / last
+        timestamps  float64 for every session, grouped by pair and sorted by time
+        scores      uint16 for every session, in the same order
+
+    read_snapshot maps the file with mmap and hands out memoryviews into the
+    session arrays, so opening a profile reads the header, chord and pair
+    tables but none of the sessions.
+
+    Usage:
+        python chordbin.py to-binary mychords.txt mychords.gsb
+        python chordbin.py to-json mychords.gsb mychords.txt
+"""
+from array import array
+import mmap
+import struct
+import sys
+
+MAGIC = b"GSCD"
+VERSION = 1
+# File extension that makes ChordData save new files in this format
+EXTENSION = ".gsb"
+
+HEADER = struct.Struct("<4sHHIIQ")  # magic, version, flags, chords, pairs, sessions
+CHORD_LENGTH = struct.Struct("<H")
+PAIR = struct.Struct("<IIQIHxxQdd")  # chord a, chord b, first session, count, high, total, first, last
+
+
+class SnapshotPair:
+    """ One row of the pair table """
+    __slots__ = ("chord_a", "chord_b", "times", "scores", "high", "total", "count", "first", "last")
+
+
+def is_snapshot(file):
+    """ True if the file starts with the snapshot magic bytes """
+    try:
+        with open(file, "rb") as savefile:
+            return savefile.read(len(MAGIC)) == MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def _align(offset):
+    """ Session arrays start on an 8 byte boundary """
+    return (offset + 7) & ~7
+
+
+def write_snapshot(file, chords, pairs):
+    """
+        Write a snapshot.
+
+        chords is the list of chord names (their position is their id)
+        pairs is a list of (chord id a, chord id b, sessions) where sessions is a
+        dict or ScoreHistory of {timestamp: score}
+    """
+    chord_table = bytearray()
+    for chord in chords:
+        name = chord.encode("utf-8")
+        chord_table += CHORD_LENGTH.pack(len(name)) + name
+
+    pair_table = bytearray()
+    times = array("d")
+    scores = array("H")
+    for chord_a, chord_b, sessions in pairs:
+        start = len(times)
+        for timestamp, score in sorted(sessions.items()):
+            times.append(timestamp)
+            scores.append(score)
+        pair_scores = scores[start:]
+        pair_table += PAIR.pack(
+            chord_a, chord_b, start, len(pair_scores),
+            max(pair_scores) if pair_scores else 0, sum(pair_scores),
+            times[start] if pair_scores else 0.0, times[-1] if pair_scores else 0.0,
+        )
+    if sys.byteorder == "big":
+        times.byteswap()
+        scores.byteswap()
+
+    with open(file, "wb") as savefile:
+        savefile.write(HEADER.pack(MAGIC, VERSION, 0, len(chords), len(pairs), len(times)))
+        savefile.write(chord_table)
+        savefile.write(pair_table)
+        offset = HEADER.size + len(chord_table) + len(pair_table)
+        savefile.write(bytes(_align(offset) - offset))
+        savefile.write(times.tobytes())
+        savefile.write(scores.tobytes())
+
+
+def read_snapshot(file):
+    """
+        Open a snapshot without reading its sessions.
+        Returns (chords, pairs) where pairs is a list of SnapshotPair whose times
+        and scores are read only memoryviews into the mapped file.
+    """
+    with open(file, "rb") as savefile:
+        if savefile.seek(0, 2) == 0:
+            return [], []
+        mapped = mmap.mmap(savefile.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, flags, chord_count, pair_count, session_count = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{file} is not a chord snapshot")
+    if version > VERSION:
+        raise ValueError(f"{file} is snapshot version {version}, this program only reads up to {VERSION}")
+
+    offset = HEADER.size
+    chords = []
+    for _ in range(chord_count):
+        length, = CHORD_LENGTH.unpack_from(mapped, offset)
+        offset += CHORD_LENGTH.size
+        chords.append(bytes(mapped[offset:offset + length]).decode("utf-8"))
+        offset += length
+
+    pair_rows = []
+    for _ in range(pair_count):
+        pair_rows.append(PAIR.unpack_from(mapped, offset))
+        offset += PAIR.size
+
+    view = memoryview(mapped)
+    times_start = _align(offset)
+    scores_start = times_start + session_count * 8
+    all_times = view[times_start:scores_start].cast("d")
+    all_scores = view[scores_start:scores_start + session_count * 2].cast("H")
+    if sys.byteorder == "big":
+        # The mapped bytes are little endian so they have to be copied and swapped
+        all_times = array("d", all_times)
+        all_times.byteswap()
+        all_scores = array("H", all_scores)
+        all_scores.byteswap()
+
+    pairs = []
+    for chord_a, chord_b, start, count, high, total, first, last in pair_rows:
+        pair = SnapshotPair()
+        pair.chord_a, pair.chord_b = chord_a, chord_b
+        pair.times = all_times[start:start + count]
+        pair.scores = all_scores[start:start + count]
+        pair.high, pair.total, pair.count = high, total, count
+        pair.first, pair.last = (first, last) if count else (None, None)
+        pairs.append(pair)
+    return chords, pairs
+
+
+def convert(source, destination, binary):
+    """ Copy a profile to destination as a binary snapshot (binary=True) or JSON """
+    import os
+    from chorddata import ChordData
+    data = ChordData(os.path.abspath(source))
+    data.binary = binary
+    data._save(os.path.abspath(destination))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] in ("to-binary", "to-json"):
+        convert(sys.argv[2], sys.argv[3], sys.argv[1] == "to-binary")
+    else:
+        print(__doc__.split("Usage:")[1].rstrip())
@@ -1,5 +1,5 @@
 """ Graphical User Interface to facilitate 60 second chord changes """
-from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot, QBasicTimer
+from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot, QBasicTimer, QTimer
 from PyQt5.QtWidgets import (
     QSizePolicy,
     QApplication,
@@ -18,8 +18,10 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QColor, QFont, QPalette
 import chorddata
+import instrument
 import util
 import time
+from bisect import bisect_left
 
 
 class ChordChanges(QWidget):
@@ -87,8 +89,7 @@ class ChordChanges(QWidget):
         self.results.ok.clicked.connect(self.raise_chordselect)
 
 
-        with open("chordchange_styles.qss") as styles:
-            self.setStyleSheet(styles.read())
+        self.setStyleSheet(util.stylesheet("chordchange_styles.qss"))
 
     @property
     def key(self):
@@ -121,7 +122,7 @@ class ChordChanges(QWidget):
         old_score = self.data.highscore(self.key)
         self.data.add_score(self.key, score, time.time())
         if score > old_score:
-            self.chord_select.chord_pair_grid.button_dict[self.key].score = score
+            self.chord_select.chord_pair_grid.update_score(self.key, score)
             self.scoreboard.update_score(score)
             self.results.generate_results(True, old_score, score)
         else:
@@ -184,11 +185,19 @@ class ChordSelect(QWidget):
         self.weighted = QPushButton("Weighted Random")
         self.weighted.setToolTip("Lower scores are more likely")
         self.weighted.clicked.connect(self.emit_weighted)
+        self.next_due = QPushButton("Next Due")
+        self.next_due.setToolTip("The pair that is most overdue for practice")
+        self.next_due.clicked.connect(self.emit_next_due)
 
+        self.randoms_hbox.addWidget(self.next_due)
         self.randoms_hbox.addWidget(self.weighted)
         self.randoms_hbox.addWidget(self.random)
 
-        self.chord_pair_grid = ChordPairGrid(data)
+        if data.pair_count > util.VIRTUAL_GRID_THRESHOLD:
+            from pairview import VirtualPairGrid
+            self.chord_pair_grid = VirtualPairGrid(data)
+        else:
+            self.chord_pair_grid = ChordPairGrid(data)
         self.chord_pair_grid.pair_clicked.connect(self.pair_selected)
 
         self.vbox.addWidget(self.randoms_container)
@@ -208,6 +217,12 @@ class ChordSelect(QWidget):
         key = self.data.weighted_random()
         self.pair_selected.emit(key, self.data.highscore(key))
 
+    def emit_next_due(self, x):
+        """ Passes the pair the scheduler says is due soonest through the pair_selected signal
+            The parameter x is a throwaway value from the PushButton.clicked signal """
+        key = self.data.next_due()
+        self.pair_selected.emit(key, self.data.highscore(key))
+
     def refresh(self):
         self.chord_pair_grid.make_buttons()
         self.chord_pair_grid.rearrange()
@@ -259,63 +274,131 @@ class ChordPairGrid(QWidget):
 
         self.layout.addWidget(self.scroll_area)
         self.layout.addWidget(sort_controls)
+
+        # Resizing the window sends a flood of resize events so wait until
+        # it has stopped for a moment before reflowing the grid
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(50)
+        self.resize_timer.timeout.connect(self.reflow)
+
         self.init_grid()
 
     def init_grid(self):
+        self.button_dict = {}
+        self.buttons = []  # Buttons in the order they are currently shown
+        # Both sort orders are kept sorted as buttons are added and scores change,
+        # with a list of sort keys next to each one so bisect can find buttons.
+        self.by_chords, self.chord_keys = [], []
+        self.by_score, self.score_keys = [], []
+        self.placed = []  # Buttons in the order they are in the grid layout
+        self.num_cols = 0
         self.make_buttons()
         self.rearrange()
 
     def make_buttons(self):
-        self.button_dict = {}
-        self.buttons = []  # This is used to make it easy to sort the buttons
-
-        for pair in self.data.scores:
-            score = self.data.highscore(pair)
+        """ Makes a button for every pair that does not have one yet """
+        if len(self.button_dict) == self.data.pair_count:
+            return
+        for pair in self.data.pairs():
             if pair not in self.button_dict:
+                score = self.data.highscore(pair)
                 new_button = PairButton(pair, score, self.button_size)
+                new_button.order = len(self.button_dict)
                 new_button.clicked.connect(self.pair_clicked.emit)
                 self.button_dict[pair] = new_button
-                self.buttons.append(new_button)
+                position = bisect_left(self.chord_keys, pair)
+                self.chord_keys.insert(position, pair)
+                self.by_chords.insert(position, new_button)
+                self._insert_by_score(new_button)
+
+    def _insert_by_score(self, button):
+        # order breaks ties so buttons with the same score stay in the order they were made
+        key = (button.score, button.order)
+        position = bisect_left(self.score_keys, key)
+        self.score_keys.insert(position, key)
+        self.by_score.insert(position, button)
+
+    def update_score(self, pair, score):
+        button = self.button_dict[pair]
+        position = bisect_left(self.score_keys, (button.score, button.order))
+        del self.score_keys[position]
+        del self.by_score[position]
+        button.score = score
+        self._insert_by_score(button)
 
     def sort_buttons(self):
         rev = self.reverse.isChecked()
         if self.sort_alphabetically.isChecked():
-            self.buttons = sorted(
-                self.button_dict.values(), reverse=rev, key=lambda button: button.pair
-            )
+            # No two buttons have the same pair so reversing is the same as sorting in reverse
+            self.buttons = self.by_chords[::-1] if rev else list(self.by_chords)
         elif self.sort_numerically.isChecked():
-            self.buttons = sorted(
-                self.button_dict.values(), reverse=rev, key=lambda button: button.score
-            )
-
-    def set_grid(self):
+            if rev:
+                self.buttons = self._reverse_scores()
+            else:
+                self.buttons = list(self.by_score)
+        elif len(self.buttons) != len(self.button_dict):
+            self.buttons = list(self.button_dict.values())
+
+    def _reverse_scores(self):
+        """
+            Highest scores first, but buttons with the same score keep their
+            original order, the same as sorted(..., reverse=True) would do.
+        """
+        buttons = []
+        end = len(self.by_score)
+        while end > 0:
+            start = bisect_left(self.score_keys, (self.score_keys[end - 1][0],), 0, end)
+            buttons.extend(self.by_score[start:end])
+            end = start
+        return buttons
+
+    def columns(self):
         # Calculate num_cols based on width of container
         # As far as I am aware there is no way to get the actual width
         # of the scroll bar. So I am estimating...
         scrollbar_width = 20
         row_length = self.scroll_area.width() - self.column_spacing - scrollbar_width
         button_space = self.button_size[0] + self.column_spacing
-        num_cols = row_length // button_space
+        return max(1, row_length // button_space)
+
+    def set_grid(self):
+        """
+            Put the buttons in the grid layout.
+            Nothing happens if the order and number of columns are the same as last time.
+        """
+        num_cols = self.columns()
+        if num_cols == self.num_cols and self.buttons == self.placed:
+            return
+        self.clear_grid()
         for count, button in enumerate(self.buttons):
             row = count // num_cols
             col = count % num_cols
             self.pair_grid.addWidget(button, row, col)
+        self.num_cols = num_cols
+        self.placed = list(self.buttons)
 
     def new_pairs(self):
         self.make_buttons()
         self.rearrange()
 
     def clear_grid(self):
-        for i in reversed(range(self.pair_grid.count())):
-            self.pair_grid.itemAt(i).widget().setParent(None)
+        # Take the buttons out of the layout but leave them in the container,
+        # reparenting every button is much slower than moving it.
+        while self.pair_grid.count():
+            self.pair_grid.takeAt(self.pair_grid.count() - 1)
 
     def rearrange(self):
-        self.clear_grid()
         self.sort_buttons()
         self.set_grid()
 
+    def reflow(self):
+        """ Only redo the grid if the window size changed the number of columns """
+        if self.columns() != self.num_cols:
+            self.set_grid()
+
     def resizeEvent(self, e):
-        self.rearrange()
+        self.resize_timer.start()
 
 
 class PairButton(QPushButton):
@@ -343,12 +426,17 @@ class PairButton(QPushButton):
 
     def set_color(self):
         """
-            Sets the color based on the COLOR_DICT
+            Puts the button in its score bucket. The colors for each bucket are
+            in the application stylesheet so only this button gets re-polished,
+            and only if the bucket actually changed.
         """
-        for threshold in util.COLOR_DICT:
-            if self.score <= threshold:
-                self.setStyleSheet(f"background-color: {util.COLOR_DICT[threshold]};")
-                return
+        bucket = util.score_bucket(self.score)
+        if bucket == self.property("bucket"):
+            return
+        self.setProperty("bucket", bucket)
+        if self.testAttribute(Qt.WA_WState_Polished):
+            self.style().unpolish(self)
+            self.style().polish(self)
 
     def mousePressEvent(self, e):
         self.clicked.emit(self.pair, self.score)
@@ -538,6 +626,9 @@ class Results(QWidget):
             self.score_entered.setStyleSheet("color: red")
 
 
+instrument.watch(ChordPairGrid, "make_buttons", "rearrange")
+
+
 def main():
     # Testing
     # TODO: clean this up
@@ -546,8 +637,7 @@ def main():
     test_data = chorddata.ChordData(sys.argv[1])
     a = QApplication([])
     b = ChordChanges(test_data)
-    with open("guitarsuite_styles.qss") as styles:
-        b.setStyleSheet(styles.read())
+    b.setStyleSheet(util.app_stylesheet())
     if 't' in sys.argv[1]:
         b.timer._preptime = 1
         b.timer._runtime = 1
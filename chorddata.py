@@ -3,35 +3,26 @@
     I am revising my old version to make it more pythonic.
 """
 import json
+import math
 import random
-import re
 import os
 import sys
+import threading
 import time
 
-# NOTE: I am wondering if I should make a class or just use a namedtuple
-
-# There are many types of chords this does not account for. I don't think
-# I will need to worry about them for the time being.
-CHORD_PATTERN = "^[a-gA-G][b#]?[m]?[2345679]?$|^[a-gA-G][b#]?[m]?1[13]$"
-chord_regex = re.compile(CHORD_PATTERN)
-
-def parse_chord(chord):
-    """
-        Takes a string as input and uses regex to verify that it is a valid chord.
-
-        The entire string passed as the argument must be valid - it should not
-        output a match if any part of the argument is invalid.
-            i.e. passing 'ABCD' should not see 'A' and consider it valid since the pattern
-            after it does not match CHORD_PATTERN
+import chordbin
+from chordnames import parse_chord
+import instrument
+from chordstream import stream_profile
+from history import ScoreHistory, check_score
+import rollups
+from sampler import PairSampler, highscore_weight
+from scheduler import Scheduler
 
-        Returns the valid chord with the key capitalized if found and None otherwise.
-    """
-    chord = chord_regex.search(chord)
-    if chord:
-        return chord.group(0).capitalize()  # Capitalize the key for consistency
-    return None
+# Once the journal grows past this many bytes it gets folded back into the save file
+JOURNAL_LIMIT = 1024 * 1024
 
+# NOTE: I am wondering if I should make a class or just use a namedtuple
 
 def normalize_key(chord_a, chord_b):
     """
@@ -44,20 +35,109 @@ def normalize_key(chord_a, chord_b):
         If either chord returns None, this function will return None
         If both chords return from parse_chord, return a sorted tuple of the two chords
     """
-    key = [(parse_chord(chord_a), parse_chord(chord_b))]
+    key = (parse_chord(chord_a), parse_chord(chord_b))
     if None in key:
         return None
     return tuple(sorted(key))
 
 
-class ChordData:
+def triangular_index(i, j):
+    """
+        Turns the ids of two chords into the index of their pair.
+
+        Pairs are numbered like the lower triangle of a table of chords:
+            (1, 0) -> 0, (2, 0) -> 1, (2, 1) -> 2, (3, 0) -> 3 ...
+        so adding chord n just adds the indexes n(n-1)/2 to n(n+1)/2 - 1 to the end.
+    """
+    if i < j:
+        i, j = j, i
+    return i * (i - 1) // 2 + j
+
+
+def triangular_ids(index):
+    """
+        Opposite of triangular_index. Returns the two chord ids (larger first).
+    """
+    i = (1 + math.isqrt(1 + 8 * index)) // 2
+    return i, index - i * (i - 1) // 2
+
+
+class PairStats:
+    """
+        Running totals for one chord pair so the high score, average and
+        first / last played times don't have to be recomputed from every session.
+    """
+    __slots__ = ("high", "total", "count", "first", "last")
+
+    def __init__(self, sessions=None):
+        self.high, self.total, self.count = 0, 0, 0
+        self.first, self.last = None, None
+        if isinstance(sessions, ScoreHistory):
+            self.high, self.total, self.count = sessions.high(), sessions.total(), len(sessions)
+            self.first, self.last = sessions.first(), sessions.last()
+        elif sessions:
+            self.high = max(sessions.values())
+            self.total = sum(sessions.values())
+            self.count = len(sessions)
+            self.first = min(sessions)
+            self.last = max(sessions)
+
+    @property
+    def average(self):
+        if self.count == 0:
+            return 0
+        return self.total // self.count
+
+    def add(self, timestamp, score):
+        if self.count == 0 or score > self.high:
+            self.high = score
+        self.total += score
+        self.count += 1
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(high={self.high}, total={self.total}, count={self.count}, first={self.first}, last={self.last})"
+
+
+# Shared stats for every pair that has not been played yet. Never modify it.
+UNPLAYED = PairStats()
+
+
+class Listeners:
+    """
+        Lets other objects (mostly the GUI) know when chords or scores are added
+        so they can update only what changed.
+
+        Listeners are called with the event name and its details:
+            listener("chord", chord, new_pairs) - after add_chord, new_pairs is a list of the pairs it made
+            listener("score", pair)             - after add_score
+    """
+
+    _listeners = ()
+
+    def add_listener(self, listener):
+        # Copy instead of appending so the class level default is never changed
+        self._listeners = list(self._listeners) + [listener]
+
+    def remove_listener(self, listener):
+        self._listeners = [other for other in self._listeners if other is not listener]
+
+    def _notify(self, event, *args):
+        for listener in self._listeners:
+            listener(event, *args)
+
+
+class ChordData(Listeners):
     """
         Class that handles my guitar progress.
         Loads and Saves data about known chords and
         chord changes progress
     """
 
-    def __init__(self, source=None):
+    def __init__(self, source=None, journal=False, journal_limit=JOURNAL_LIMIT, progress=None):
         if source != None:
             if os.path.isabs(source):
                 self._file = source
@@ -67,7 +147,25 @@ class ChordData:
             # Defaults to mychords.txt if no file is given. Maybe there is a way to implement a config that sets the default
             self._file = "./mychords.txt"
 
-        self._load()
+        # In journal mode every add_chord / add_score is appended to a small log
+        # next to the save file, so nothing is lost if the program crashes and
+        # saving does not have to rewrite the whole history every time.
+        self.journal = journal
+        self.journal_limit = journal_limit
+        self._journal_handle = None
+        self._replaying = False
+        self._sampler = None
+        self._scheduler = None
+        self._weighting = None
+        # Every change bumps the generation. The save file is up to date when the
+        # generation it was written from is the current one (see dirty).
+        # The lock is held while changing the data or taking a snapshot of it, so
+        # another thread (autosave.AutoSaver) can save while the GUI keeps going.
+        self.lock = threading.RLock()
+        self._generation = 0
+        self._saved_generation = 0
+
+        self._load(progress=progress)
 
     # NOTE should I return copies of the chords and scores? I believe it would be safer because another program could
     #      alter the ChordData.__chords/__scores attributes bypassing the chord parser. But at the same time it is convenient
@@ -76,17 +174,72 @@ class ChordData:
     @property
     def chords(self):
         """ Returns list containing known chords. No duplicates.
-            Returns a copy because the list should be changed using the ChordData.add_chord method"""
+            The list should only be changed using the ChordData.add_chord method since each
+            chord's position in it is also its id"""
         return self.__chords
 
     @property
     def scores(self):
         """
-        Return dict containing all chord pairs playable from known chords and
-        high score reached in One-Minute Chord Changes
+        Return dict containing the chord pairs that have been played and
+        their {timestamp: score} history in One-Minute Chord Changes.
+        The histories are ScoreHistory objects sorted by timestamp.
+
+        Pairs that have never been played are not in here. Use pairs() to
+        go through every pair that can be made from the known chords.
         """
         return self.__scores
 
+    def stats(self, pair):
+        """
+            Returns the PairStats for the given pair.
+            These are kept up to date by add_score so changing self.scores
+            directly will make them wrong.
+            Pairs that have not been played share the empty UNPLAYED stats.
+        """
+        stats = self.__stats[self.pair_index(pair)]
+        if stats is None:
+            return UNPLAYED
+        return stats
+
+    def pairs(self):
+        """
+            Yields every chord pair that can be made from the known chords,
+            played or not, in order of their index.
+        """
+        for i in range(1, len(self.__chords)):
+            for j in range(i):
+                yield self.pair_at(triangular_index(i, j))
+
+    @property
+    def pair_count(self):
+        """ Number of chord pairs that can be made from the known chords """
+        return len(self.__chords) * (len(self.__chords) - 1) // 2
+
+    def chord_id(self, chord):
+        """ Returns the id of a known chord (its position in self.chords) or None """
+        return self.__ids.get(chord)
+
+    def pair_index(self, pair):
+        """
+            Returns the index of a pair of known chords (see triangular_index).
+            Raises KeyError if either chord is unknown or both are the same chord.
+        """
+        try:
+            i, j = self.__ids[pair[0]], self.__ids[pair[1]]
+        except KeyError:
+            raise KeyError(pair) from None
+        if i == j:
+            # triangular_index(i, i) is the index of a different pair
+            raise KeyError(pair)
+        return triangular_index(i, j)
+
+    def pair_at(self, index):
+        """ Returns the chord pair (sorted like the keys of self.scores) at the given index """
+        i, j = triangular_ids(index)
+        chord_a, chord_b = self.__chords[i], self.__chords[j]
+        return (chord_a, chord_b) if chord_a < chord_b else (chord_b, chord_a)
+
     @property
     def file(self):
         """
@@ -94,22 +247,110 @@ class ChordData:
         """
         return self._file
 
+    @property
+    def dirty(self):
+        """ True if something changed since the save file was last written """
+        return self._generation != self._saved_generation
+
+    @property
+    def journal_file(self):
+        """
+            Returns the file that journal records are appended to.
+        """
+        return self._file + ".journal"
+
     def highscore(self, pair):
         """
             Get the highest score for the given pair
         """
-        return max(self.__scores[pair].values())
+        return self.stats(pair).high
 
     def avgscore(self, pair):
-        return sum(self.__scores[pair].values()) // len(self.__scores[pair].values())
+        return self.stats(pair).average
+
+    def lastplayed(self, pair):
+        """
+            Get the most recent timestamp for the given pair or None if it was never played
+        """
+        return self.stats(pair).last
+
+    @property
+    def rollups_file(self):
+        """
+            Returns the file the day / week / month totals are saved in.
+        """
+        return self._file + ".rollups"
+
+    @property
+    def rollups(self):
+        """
+            The Rollups (per day / week / month totals, see rollups.py) for this profile.
+            They are read with the profile if they were saved with it, otherwise they
+            are worked out from the sessions the first time they are needed.
+        """
+        with self.lock:
+            if self._rollups is None:
+                self._rollups = rollups.Rollups.build(self.__scores)
+            return self._rollups
+
+    def rollup(self, resolution, pair=None, t0=None, t1=None):
+        """
+            Returns (bucket start, count, high, mean, total) rows for each day, week or month
+            (resolution) that starts in [t0, t1), for one pair or every pair if pair is None.
+            This never reads the sessions themselves once the rollups exist.
+        """
+        if pair is not None:
+            pair = self.pair_at(self.pair_index(pair))
+        return self.rollups.series(resolution, pair, t0, t1)
+
+    def firstplayed(self, pair):
+        """
+            Get the oldest timestamp for the given pair or None if it was never played
+        """
+        return self.stats(pair).first
+
+    def _history(self, pair):
+        """ The pair's ScoreHistory, or None if it was never played. KeyError if a chord is unknown """
+        return self.__scores.get(self.pair_at(self.pair_index(pair)))
 
+    def sessions(self, pair, t0=None, t1=None):
+        """
+            Returns a ScoreHistory with the pair's sessions where t0 <= timestamp < t1.
+            Leave t0 or t1 out to not limit that end. The sessions are found by
+            bisecting the sorted timestamps so this is O(log n + sessions returned).
+        """
+        history = self._history(pair)
+        if history is None:
+            return ScoreHistory()
+        return history.between(t0, t1)
+
+    def last_sessions(self, pair, count):
+        """ Returns a ScoreHistory with the pair's most recent count sessions """
+        history = self._history(pair)
+        if history is None:
+            return ScoreHistory()
+        return history.tail(count)
+
+    def best_score(self, pair, t0=None, t1=None):
+        """
+            Highest score for the pair in sessions where t0 <= timestamp < t1,
+            or None if it wasn't played in that time.
+        """
+        if t0 is None and t1 is None:
+            stats = self.stats(pair)
+            return stats.high if stats.count else None
+        history = self._history(pair)
+        if history is None:
+            return None
+        return history.high(t0, t1)
 
     def add_chord(self, chord):
         """
             Add chord to self.chords.
-            Chord is first checked by parse_chord to make sure it is a real chord.
+            Chord is first checked by parse_chord to make sure it is a real chord
+            and spelled the same way as every other time it is added.
             Check if chord is duplicate
-            If not duplicate, first update the dict of chord pairs, then add the chord to the list of chords
+            If not duplicate, first update the chord pairs, then add the chord to the list of chords
 
             returns
                 True if chord is added to self.chords
@@ -118,46 +359,140 @@ class ChordData:
         """
         chord = parse_chord(chord)
         if chord:
-            if chord in self.chords:
-                return False
-            else:
+            with self.lock:
+                if chord in self.__ids:
+                    return False
+                first_index = len(self.__stats)
                 self._update_chordpairs(chord)
-                self.chords.append(chord)
-                return chord
+                self.__ids[chord] = len(self.__chords)
+                self.__chords.append(chord)
+                self._generation += 1
+                self._log(["c", chord])
+            self._notify("chord", chord, [self.pair_at(index) for index in range(first_index, len(self.__stats))])
+            return chord
         return None
 
+    def classify_chords(self, chords):
+        """
+            Sorts chord names into (new, known, invalid) lists in one pass.
+            new holds the parsed names of chords that would be added, without duplicates,
+            in the order they were first seen. known and invalid hold the names as given.
+        """
+        new, known, invalid = {}, [], []
+        for chord in chords:
+            parsed = parse_chord(chord)
+            if parsed is None:
+                invalid.append(chord)
+            elif parsed in self.__ids or parsed in new:
+                known.append(chord)
+            else:
+                new[parsed] = None
+        return list(new), known, invalid
+
+    def add_chords(self, chords):
+        """
+            Add a lot of chords at once. Ends up the same as calling add_chord
+            for each of them but the pairs for all of the new chords are made in
+            one go and the journal is written once.
+
+            Returns (added, known, invalid) like classify_chords.
+        """
+        added, known, invalid = self.classify_chords(chords)
+        if not added:
+            return added, known, invalid
+        with self.lock:
+            first_index = len(self.__stats)
+            old_count = len(self.__chords)
+            # Each new chord pairs with every chord before it, old and new
+            new_pairs = old_count * len(added) + len(added) * (len(added) - 1) // 2
+            self.__stats.extend([None] * new_pairs)
+            if self._sampler is not None:
+                for _ in range(new_pairs):
+                    self._sampler.add(UNPLAYED)
+            if self._scheduler is not None:
+                for _ in range(new_pairs):
+                    self._scheduler.add()
+            for chord in added:
+                self.__ids[chord] = len(self.__chords)
+                self.__chords.append(chord)
+            self._generation += len(added)
+            self._log(*(["c", chord] for chord in added))
+        if self._listeners:
+            index = first_index
+            for chord_id, chord in enumerate(added, old_count):
+                self._notify("chord", chord, [self.pair_at(i) for i in range(index, index + chord_id)])
+                index += chord_id
+        return added, known, invalid
+
     def add_score(self, pair, score, timestamp=None):
         """
         Adds the score the the chord pair's dict of times and scores
+        The pair's history is created the first time it gets a score
+        Raises ValueError if the score is not a whole number from 0 to history.MAX_SCORE
         """
-        # key = normalize_key(*pair)
-        key = pair
+        check_score(score)
+        try:
+            index = self.pair_index(pair)
+        except KeyError:
+            raise IndexError(f"Key not found {pair}") from None
+        key = self.pair_at(index)
         if timestamp == None:
             timestamp = time.time()
-        if key in self.scores:
-            self.scores[key][timestamp] = score
-            return True
-        raise IndexError(f"Key not found {pair}")
+        with self.lock:
+            if key not in self.__scores:
+                self.__scores[key] = self._new_history({})
+                self.__stats[index] = PairStats()
+            sessions = self.__scores[key]
+            overwritten = timestamp in sessions
+            if overwritten:
+                # Overwriting a session can lower the high score so start over
+                old_score = sessions[timestamp]
+                sessions[timestamp] = score
+                self.__stats[index] = PairStats(sessions)
+                if self._rollups is not None:
+                    self._rollups.replace(key, timestamp, old_score, score, sessions)
+            else:
+                sessions[timestamp] = score
+                self.__stats[index].add(timestamp, score)
+                if self._rollups is not None:
+                    self._rollups.add(key, timestamp, score)
+            if self._sampler is not None:
+                self._sampler.update(index, self.__stats[index])
+            if self._scheduler is not None:
+                if not overwritten and sessions.last() == timestamp:
+                    self._scheduler.update(index, timestamp, score)
+                else:
+                    # Changed or older than the last session, so the review history has to be redone
+                    self._scheduler.reset(index, sessions)
+            self._generation += 1
+            self._log(["s", "&".join(key), timestamp, score])
+        self._notify("score", key)
+        return True
 
     def _update_chordpairs(self, chord):
         """
-            Adds a new key to self.scores for each combination of chord and each
-            chord in self.chords
+            Makes room for the pairs of chord and each chord in self.chords
 
             This function is automatically called when a chord is added to self.chords
-            Each new chord pair is initally given a dict with one item: the timestamp of it's creation with a value of None
+            The new chord gets the next id, so its pairs are appended to the end of self.__stats
+            in the same order as their triangular indexes.
+            The pairs are not put in self.scores until they get their first score.
         """
-        for old_chord in self.chords:
-            new_key = tuple(sorted([chord, old_chord]))
-            self.scores[new_key] = {time.time(): 0}
+        new_pairs = len(self.__chords)
+        self.__stats.extend([None] * new_pairs)
+        if self._sampler is not None:
+            for _ in range(new_pairs):
+                self._sampler.add(UNPLAYED)
+        if self._scheduler is not None:
+            for _ in range(new_pairs):
+                self._scheduler.add()
 
     def random_key(self):
         """
-            Uses random.choice to select a key from self.scores
+            Picks a random pair index and returns the pair at it, every pair is equally likely
         """
-        return random.choice(list(self.scores))
+        return self.pair_at(random.randrange(self.pair_count))
 
-    # I made this method a long time ago and I want to rewrite it
     def weighted_random(self, offset=5):
         """
             Returns a key chosen randomly from self.scores.
@@ -166,25 +501,72 @@ class ChordData:
             Use random_key to get a random key with even distribution
 
             How it is weighted:
-                1. Select the target - the lowest score in the dict.
-                2. Select a key - use random.choice to pick a key.
-                3. Generate an int - use random.randint to pick an int
-                   in range 0 to <key_selected> + offset
-                4. if the generated int is less than the target, return that key.
-                   else, go back to step 2.
-
-            The parameter offset determines how much to add to the random int each time.
-            This makes it so the lowest score is not always guaranteed to be chosen.
+                Each pair's chance of being picked is proportional to 1 / (<high score> + offset + 1).
+                This is the same chance the old version gave each pair when it picked a key
+                and then rerolled until randint(0, <high score> + offset) was at most the lowest
+                high score, but without the loop that could go on forever.
+
+            The parameter offset keeps the lowest score from always being chosen.
             By default the offset is 5.
+
+            If set_weighting was called, its weight function is used and offset is ignored.
         """
-        keys = list(self.scores)
-        # Should I use high score or average score to weight the chord pairs?
-        # I think the best would be some function that uses both high and average, and the timestamps to determine some metric to base it off of
-        target = min([self.highscore(pair) for pair in self.scores])
-        key = random.choice(keys)
-        while random.randint(0, self.highscore(key) + offset) > target:
-            key = random.choice(keys)
-        return key
+        return self.pair_at(self._get_sampler(offset).draw())
+
+    def weighted_randoms(self, count, offset=5):
+        """
+            Returns a list of count keys chosen the same way as weighted_random
+        """
+        return [self.pair_at(index) for index in self._get_sampler(offset).draw_many(count)]
+
+    def set_weighting(self, weight=None, seed=None):
+        """
+            Change how weighted_random weights the chord pairs.
+            weight is a function that takes a PairStats (see the functions in sampler.py).
+            seed makes the random picks repeatable.
+            Passing no weight goes back to the default high score weighting.
+        """
+        self._weighting = weight
+        self._sampler = None
+        self._get_sampler(5, seed)
+
+    def _get_sampler(self, offset, seed=None):
+        """
+            Builds the sampler the first time it is needed.
+            After that add_score and add_chord keep its weights up to date.
+        """
+        if self._sampler is None or (self._weighting is None and self._sampler.weight.offset != offset):
+            weight = self._weighting if self._weighting is not None else highscore_weight(offset)
+            self._sampler = PairSampler(weight, seed, (UNPLAYED if stats is None else stats for stats in self.__stats))
+        return self._sampler
+
+    def _get_scheduler(self):
+        """
+            Builds the scheduler from every pair's history the first time it is needed.
+            After that add_score and add_chord keep it up to date.
+        """
+        with self.lock:
+            if self._scheduler is None:
+                self._scheduler = Scheduler(
+                    None if stats is None else self.__scores[self.pair_at(index)]
+                    for index, stats in enumerate(self.__stats)
+                )
+            return self._scheduler
+
+    def next_due(self):
+        """
+            Returns the pair that is due to be practiced soonest (see scheduler.py).
+            Pairs that were never played are always due.
+        """
+        return self.pair_at(self._get_scheduler().next_due()[0])
+
+    def due_pairs(self, now=None):
+        """ Returns [(pair, due time)] for every pair that is due by now (default: right now), soonest first """
+        return [(self.pair_at(index), due) for index, due in self._get_scheduler().due(now)]
+
+    def due_time(self, pair):
+        """ When the pair is due to be practiced next, 0 if it was never played """
+        return self._get_scheduler().due_time(self.pair_index(pair))
 
     @file.setter
     def file(self, file):
@@ -194,9 +576,14 @@ class ChordData:
         return self
 
     def __exit__(self, error_type, value, traceback):
-        if traceback is None:
+        if self.journal:
+            # Everything is already in the journal so only compact if it got too big
+            if traceback is None and self._journal_size() > self.journal_limit:
+                self.compact()
+            self._close_journal()
+        elif traceback is None:
             self._save()
-        else:
+        if traceback is not None:
             raise Exception(error_type, value, traceback)
 
     def __repr__(self):
@@ -209,39 +596,142 @@ class ChordData:
         return f"{self.__class__.__name__}('{self._file}')"
 
     def __str__(self):
-        return f"{self.__class__.__name__}(Chords: {len(self.chords)}, Pairs: {len(self.scores)})"
+        return f"{self.__class__.__name__}(Chords: {len(self.chords)}, Pairs: {self.pair_count})"
 
-    def _load(self, file=None, sep="&"):
+    def _load(self, file=None, sep="&", progress=None):
         """
             Loads chords and scores from JSON format txt file If the file does
             not exist it will create it
+            Binary snapshots (see chordbin.py) are detected and loaded too.
 
             The sep parameter sets the character the dictionary keys are using
             to delimit the chords. This is because in Python the dict's keys are
             tuples which do not work with JSON.
+
+            progress is called with (bytes read, file size) while the file is read.
         """
         if file is None:
             file = self.file
+        self.__chords, self.__ids, self.__stats, self.__scores = [], {}, [], {}
+        if chordbin.is_snapshot(file):
+            self.binary = True
+            self._load_snapshot(file)
+        else:
+            # New or empty files with the snapshot extension get saved as snapshots
+            self.binary = file.endswith(chordbin.EXTENSION) and (not os.path.exists(file) or os.path.getsize(file) == 0)
+            self._load_json(file, sep, progress)
+        self._sampler = None
+        self._scheduler = None
+        self._rollups = None
+        renamed = self._canonicalize()
+        if file == self.file:
+            # The saved rollups match the save file, the journal is added on top like the sessions are.
+            # If chords were renamed the saved rollups have the old names so they get rebuilt.
+            if not renamed:
+                self._rollups = rollups.load(self.rollups_file, file, sep)
+            self._replay_journal(sep)
+
+    def _load_json(self, file, sep, progress):
+        """
+            Loads a JSON save file. See _load for the arguments.
+        """
         try:
-            if os.path.getsize(file) == 0:
-                self.__chords, self.__scores = [], {}
-            else:
-                with open(file, "r") as savefile:
-                    self.__chords, json_dict = json.load(savefile)
-                    # I need to loop through the dict loaded from the file to
-                    #   1. Turn the chord pairs into tuples
-                    #   2. turn the timestamps into floats.
-                    self.__scores = {
-                            tuple(key.split(sep)): {float(timestamp): score for timestamp, score in value.items()} for key, value in json_dict.items()
-                    }
+            # The file is read one chord pair at a time (see chordstream.py) and each
+            # pair goes straight into its final form, so there is never a second
+            # copy of the whole file in memory.
+            profile = stream_profile(file, progress)
+            self.__chords = next(profile)
+            self.__ids = {chord: i for i, chord in enumerate(self.__chords)}
+            self.__stats = [None] * self.pair_count
+            # I need to loop through the pairs loaded from the file to
+            #   1. Turn the chord pairs into tuples
+            #   2. turn the timestamps into floats.
+            # Older versions saved a {creation time: 0} placeholder for every pair.
+            # Those can't be told apart from a real score of 0, so they are kept.
+            for key, sessions in profile:
+                pair = self._intern_pair(key.split(sep))
+                self.__scores[pair] = self._new_history((float(timestamp), score) for timestamp, score in sessions)
+                if pair[0] in self.__ids and pair[1] in self.__ids:
+                    self.__stats[self.pair_index(pair)] = PairStats(self.__scores[pair])
         except FileNotFoundError:
             # If the given file was not found, don't do anything about it yet because the _save method can create the file.
-            self.__chords, self.__scores = [], {}
+            pass
+
+    def _load_snapshot(self, file):
+        """
+            Opens a binary snapshot (see chordbin.py).
+            The sessions stay in the mapped file until they are changed, and the
+            stats come from the pair table, so none of the sessions are read here.
+        """
+        self.__chords, pairs = chordbin.read_snapshot(file)
+        self.__ids = {chord: i for i, chord in enumerate(self.__chords)}
+        self.__stats = [None] * self.pair_count
+        for row in pairs:
+            index = triangular_index(row.chord_a, row.chord_b)
+            self.__scores[self.pair_at(index)] = ScoreHistory.from_arrays(row.times, row.scores)
+            stats = PairStats()
+            stats.high, stats.total, stats.count = row.high, row.total, row.count
+            stats.first, stats.last = row.first, row.last
+            self.__stats[index] = stats
+
+    def _canonicalize(self):
+        """
+            Older versions kept spellings like E# or Cb that parse_chord now turns
+            into F and B, so a profile could end up with both E# and F.
+            Renames those chords and merges the pairs that become the same pair.
+            When two merged pairs have a session at the same time the higher score is kept.
+            A pair of two spellings of one chord (E# and F) is not a pair anymore so it is dropped.
+
+            Returns True if anything was renamed. The data is marked as changed so
+            the next save writes the new names.
+        """
+        names = [parse_chord(chord) or chord for chord in self.__chords]
+        if names == self.__chords:
+            return False
+        merged = {}
+        for (chord_a, chord_b), sessions in self.__scores.items():
+            chord_a, chord_b = parse_chord(chord_a) or chord_a, parse_chord(chord_b) or chord_b
+            if chord_a == chord_b:
+                continue
+            key = (chord_a, chord_b) if chord_a < chord_b else (chord_b, chord_a)
+            if key not in merged:
+                merged[key] = sessions
+                continue
+            if not isinstance(merged[key], dict):
+                merged[key] = dict(merged[key].items())
+            for timestamp, score in sessions.items():
+                merged[key][timestamp] = max(score, merged[key].get(timestamp, score))
+        # The first spelling of a chord keeps its place in the list
+        self.__chords = list(dict.fromkeys(names))
+        self.__ids = {chord: i for i, chord in enumerate(self.__chords)}
+        self.__stats = [None] * self.pair_count
+        self.__scores = {}
+        for key, sessions in merged.items():
+            pair = self._intern_pair(key)
+            self.__scores[pair] = self._new_history(sessions) if isinstance(sessions, dict) else sessions
+            if pair[0] in self.__ids and pair[1] in self.__ids:
+                self.__stats[self.pair_index(pair)] = PairStats(self.__scores[pair])
+        self._generation += 1
+        return True
+
+    def _intern_pair(self, chords):
+        """
+            Build a pair tuple out of the strings already in self.chords
+            so every pair doesn't hold its own copies of the chord names.
+        """
+        chord_a, chord_b = chords
+        if chord_a in self.__ids:
+            chord_a = self.__chords[self.__ids[chord_a]]
+        if chord_b in self.__ids:
+            chord_b = self.__chords[self.__ids[chord_b]]
+        return (chord_a, chord_b)
 
     def _save(self, file=None, sep="&"):
         """
             Save the contents of self.chords and self.scores to a JSON txt file.
             If no file is given it will save to mychords.txt in the working directory
+            If the profile was loaded from a binary snapshot (or self.binary was set)
+            it is saved as a binary snapshot instead.
 
             The sep parameter sets the character to join the keys of self.scores.
                 (Since the keys are tuples which are incompatible with JSON they are
@@ -249,14 +739,151 @@ class ChordData:
         """
         if file is None:
             file = self.file
-        with open(file, "w+") as savefile:
-            json_dict = {sep.join(key): value for key, value in self.scores.items()}
-            json.dump([self.chords, json_dict], savefile, indent=2)
+        with self.lock:
+            generation, chords, scores = self.snapshot()
+            saved_rollups = None
+            if file == self.file and self._rollups is not None:
+                saved_rollups = self._rollups.to_json(sep)
+        # Write to a temporary file first so a crash halfway through a save
+        # can't leave a truncated save file behind. Each thread gets its own
+        # temporary file in case the autosave thread and the GUI save at once.
+        temp_file = f"{file}.{threading.get_ident()}.tmp"
+        try:
+            if self.binary:
+                ids = {chord: chord_id for chord_id, chord in enumerate(chords)}
+                pairs = [(ids[a], ids[b], sessions) for (a, b), sessions in scores.items()
+                         if a in ids and b in ids]
+                chordbin.write_snapshot(temp_file, chords, pairs)
+            else:
+                with open(temp_file, "w+") as savefile:
+                    json_dict = {sep.join(key): dict(value.items()) for key, value in scores.items()}
+                    json.dump([chords, json_dict], savefile, indent=2)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        with self.lock:
+            if file != self.file:
+                os.replace(temp_file, file)
+            elif generation < self._saved_generation:
+                # A newer snapshot was saved while this one was being written
+                os.remove(temp_file)
+            else:
+                os.replace(temp_file, file)
+                self._saved_generation = generation
+                if generation == self._generation:
+                    # The save file now contains everything in the journal
+                    self._truncate_journal()
+                save_fingerprint = rollups.fingerprint(file)
+        if saved_rollups is None or generation < self._saved_generation:
+            return
+        # The rollups say which save file they go with, so if the program dies
+        # before they are written they are just rebuilt next time
+        temp_file = rollups.save(self.rollups_file, saved_rollups, save_fingerprint)
+        with self.lock:
+            if generation == self._saved_generation:
+                os.replace(temp_file, self.rollups_file)
+            else:
+                os.remove(temp_file)
+
+    def snapshot(self):
+        """
+            Returns (generation, chords, scores) copies of the data that later
+            changes won't touch, so they can be written out without holding the lock.
+        """
+        with self.lock:
+            scores = {key: sessions.copy() for key, sessions in self.__scores.items()}
+            return self._generation, list(self.__chords), scores
+
+    def _new_history(self, sessions):
+        """
+            Makes the container for one pair's sessions from a dict or (timestamp, score) pairs.
+            Sessions are kept sorted by time (two arrays, see history.py) so the
+            range queries can bisect, and they use a lot less memory than a dict.
+        """
+        return ScoreHistory(sessions)
+
+    def compact(self):
+        """
+            Fold the journal back into the save file.
+            Writes a full snapshot and then empties the journal.
+        """
+        self._save()
+
+    def _log(self, *records):
+        """
+            Append records to the journal if journal mode is on.
+            Records are compact JSON lists, one per line:
+                ["c", chord]                    - chord added
+                ["s", "A&B", timestamp, score]  - score added
+        """
+        if not self.journal or self._replaying:
+            return
+        if self._journal_handle is None:
+            self._journal_handle = open(self.journal_file, "a")
+        self._journal_handle.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self._journal_handle.flush()
+        if self._journal_handle.tell() > self.journal_limit:
+            self.compact()
+
+    def _journal_size(self):
+        try:
+            return os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            return 0
+
+    def _close_journal(self):
+        if self._journal_handle is not None:
+            self._journal_handle.close()
+            self._journal_handle = None
+
+    def _truncate_journal(self):
+        self._close_journal()
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def _replay_journal(self, sep="&"):
+        """
+            Apply the records in the journal on top of the snapshot that was just loaded.
+
+            Replaying is idempotent - adding a known chord does nothing and a score
+            with the same timestamp just overwrites itself - so it does not matter if
+            the program died after writing a snapshot but before emptying the journal.
+            A half written last line (the program died mid-write) is skipped, and in
+            journal mode it is cut off so the next record starts on its own line.
+        """
+        try:
+            with open(self.journal_file, "rb") as journal:
+                contents = journal.read()
+        except FileNotFoundError:
+            return
+        complete = contents.rfind(b"\n") + 1
+        if complete < len(contents) and self.journal:
+            with open(self.journal_file, "r+b") as journal:
+                journal.truncate(complete)
+        lines = contents[:complete].decode("utf-8").splitlines()
+        self._replaying = True
+        try:
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record[0] == "c":
+                    self.add_chord(record[1])
+                elif record[0] == "s":
+                    _, key, timestamp, score = record
+                    # Journals from before _canonicalize can still have the old spellings
+                    pair = tuple(parse_chord(chord) or chord for chord in key.split(sep))
+                    self.add_score(pair, score, timestamp)
+        finally:
+            self._replaying = False
 
 
 # Using properties this way passes a reference to the real chordlist and scoredict. So
 # any changes made to the scoredict, even though it is received through the getter,
 # changes the Class' property itself.
+instrument.watch(ChordData, "_load", "_save", "weighted_random", "highscore")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -0,0 +1,107 @@
+"""
+    Every chord name the program understands, worked out ahead of time.
+
+    A chord is a root (a letter and maybe a sharp or flat) followed by a
+    quality. Each quality has a canonical spelling and the other ways people
+    write it, so "Bbmin7", "Bb-7" and "bbm7" are all the chord "Bbm7".
+    Roots that are just another name for a natural note (E#, B#, Fb, Cb) are
+    spelled as that note. Other sharps and flats are left the way they were
+    written since C# and Db are both common and profiles already use both.
+
+    SPELLINGS maps every accepted spelling straight to its canonical name so
+    checking a chord is one dict lookup.
+"""
+from functools import lru_cache
+
+LETTERS = "ABCDEFG"
+ACCIDENTALS = {
+        "": "",
+        "#": "#",
+        "♯": "#",
+        "b": "b",
+        "♭": "b",
+    }
+ENHARMONIC = {"E#": "F", "B#": "C", "Fb": "E", "Cb": "B"}
+
+# canonical quality: every way of writing it
+QUALITIES = {
+        "": ("", "maj", "M", "major"),
+        "m": ("m", "min", "minor", "-"),
+        "dim": ("dim", "o", "°"),
+        "aug": ("aug", "+"),
+        "sus2": ("sus2",),
+        "sus4": ("sus4", "sus"),
+        "6": ("6",),
+        "m6": ("m6", "min6", "-6"),
+        "7": ("7", "dom7"),
+        "maj7": ("maj7", "M7", "Maj7", "ma7", "Δ7", "Δ"),
+        "m7": ("m7", "min7", "-7"),
+        "mMaj7": ("mMaj7", "mmaj7", "mM7", "minmaj7", "m(maj7)"),
+        "dim7": ("dim7", "o7", "°7"),
+        "m7b5": ("m7b5", "min7b5", "-7b5", "ø", "ø7"),
+        "aug7": ("aug7", "+7", "7#5", "7+5"),
+        "7sus4": ("7sus4", "7sus"),
+        "7b9": ("7b9",),
+        "7#9": ("7#9",),
+        "9": ("9",),
+        "m9": ("m9", "min9", "-9"),
+        "maj9": ("maj9", "M9"),
+        "add9": ("add9", "add2"),
+        "madd9": ("madd9", "madd2", "minadd9"),
+        "11": ("11",),
+        "m11": ("m11", "min11", "-11"),
+        "13": ("13",),
+        "m13": ("m13", "min13", "-13"),
+        "maj13": ("maj13", "M13"),
+        # The old regex accepted a number after the root (and an optional m)
+        # so these stay valid for save files that already have them
+        "2": ("2",),
+        "3": ("3",),
+        "4": ("4",),
+        "5": ("5",),
+        "m2": ("m2",),
+        "m3": ("m3",),
+        "m4": ("m4",),
+        "m5": ("m5",),
+    }
+
+
+def _spellings():
+    spellings = {}
+    for letter in LETTERS:
+        for accidental, canonical_accidental in ACCIDENTALS.items():
+            root = letter + canonical_accidental
+            root = ENHARMONIC.get(root, root)
+            for quality, aliases in QUALITIES.items():
+                chord = root + quality
+                for alias in aliases:
+                    for written_letter in (letter, letter.lower()):
+                        spelling = written_letter + accidental + alias
+                        if spellings.setdefault(spelling, chord) != chord:
+                            raise ValueError(f"{spelling} could be {spellings[spelling]} or {chord}")
+    return spellings
+
+
+SPELLINGS = _spellings()
+
+
+def canonical_chords():
+    """ Returns every chord name parse_chord can return """
+    return sorted(set(SPELLINGS.values()))
+
+
+@lru_cache(maxsize=4096)
+def _parse_unusual(chord):
+    """ Spellings that are not in the table as they are, like ones with spaces around them """
+    return SPELLINGS.get("".join(chord.split()))
+
+
+def parse_chord(chord):
+    """
+        Returns the canonical name of chord or None if it is not a chord.
+        The whole string has to be a chord, 'ABCD' is not 'A'.
+    """
+    name = SPELLINGS.get(chord)
+    if name is None:
+        return _parse_unusual(chord)
+    return name
@@ -0,0 +1,383 @@
+"""
+    SQLite version of ChordData.
+    Big profiles don't have to be loaded into memory all at once or rewritten
+    every time they are saved. Every query is done by SQLite and every change
+    is written in its own transaction.
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+from collections.abc import Mapping
+
+from chorddata import ChordData, Listeners, PairStats, parse_chord
+from history import ScoreHistory, check_score
+from sampler import highscore_weight
+from scheduler import Scheduler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chords (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS pairs (
+    id INTEGER PRIMARY KEY,
+    chord_a TEXT NOT NULL,
+    chord_b TEXT NOT NULL,
+    UNIQUE (chord_a, chord_b)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    pair_id INTEGER NOT NULL REFERENCES pairs(id),
+    timestamp REAL NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (pair_id, timestamp)
+);
+CREATE INDEX IF NOT EXISTS sessions_timestamp ON sessions(timestamp);
+"""
+
+
+class ScoreView(Mapping):
+    """
+        Read only dict-like view of the sessions table so code written for
+        ChordData.scores still works.
+        scores[pair] runs a query and returns a normal {timestamp: score} dict.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, pair):
+        pair_id = self._data._pair_id(pair)
+        if pair_id is None:
+            raise KeyError(pair)
+        rows = self._data._db.execute(
+            "SELECT timestamp, score FROM sessions WHERE pair_id = ? ORDER BY timestamp", (pair_id,)
+        )
+        return dict(rows)
+
+    def __contains__(self, pair):
+        return self._data._pair_id(pair) is not None
+
+    def __iter__(self):
+        for chord_a, chord_b in self._data._db.execute("SELECT chord_a, chord_b FROM pairs ORDER BY id"):
+            yield (chord_a, chord_b)
+
+    def __len__(self):
+        return self._data._db.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+
+
+class SQLChordData(Listeners):
+    """
+        Same interface as ChordData but the chords and scores live in a SQLite database.
+    """
+
+    def __init__(self, source=None):
+        if source != None:
+            if os.path.isabs(source):
+                self._file = source
+            else:
+                self._file = os.path.join(os.path.dirname(__file__), source)
+        else:
+            self._file = "./mychords.db"
+
+        self._db = sqlite3.connect(self._file)
+        with self._db:
+            self._db.executescript(SCHEMA)
+        self._scores = ScoreView(self)
+        self._scheduler = None
+        self._weighting = None
+        self._rng = random.Random()
+
+    @property
+    def chords(self):
+        """ Returns list containing known chords in the order they were added. """
+        return [name for name, in self._db.execute("SELECT name FROM chords ORDER BY id")]
+
+    @property
+    def scores(self):
+        """
+            Returns a read only mapping of chord pair -> {timestamp: score}
+            Use add_score to record a new score.
+        """
+        return self._scores
+
+    @property
+    def file(self):
+        return self._file
+
+    @property
+    def pair_count(self):
+        return len(self._scores)
+
+    def pairs(self):
+        """ Yields every chord pair in the order they were created """
+        return iter(self._scores)
+
+    def _pair_id(self, pair):
+        row = self._db.execute("SELECT id FROM pairs WHERE chord_a = ? AND chord_b = ?", tuple(pair)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def highscore(self, pair):
+        """
+            Get the highest score for the given pair
+        """
+        return self.stats(pair).high
+
+    def avgscore(self, pair):
+        return self.stats(pair).average
+
+    def lastplayed(self, pair):
+        """
+            Get the most recent timestamp for the given pair
+        """
+        return self.stats(pair).last
+
+    def firstplayed(self, pair):
+        """
+            Get the oldest timestamp for the given pair
+        """
+        return self.stats(pair).first
+
+    def _sessions_query(self, pair, where, parameters, order="ASC", limit=-1):
+        pair_id = self._pair_id(pair)
+        if pair_id is None:
+            raise KeyError(pair)
+        rows = self._db.execute(
+            f"SELECT timestamp, score FROM sessions WHERE pair_id = ? {where} ORDER BY timestamp {order} LIMIT ?",
+            (pair_id, *parameters, limit),
+        ).fetchall()
+        return ScoreHistory(rows)
+
+    def sessions(self, pair, t0=None, t1=None):
+        """
+            Returns a ScoreHistory with the pair's sessions where t0 <= timestamp < t1.
+            The primary key on (pair_id, timestamp) makes this a range scan.
+        """
+        where, parameters = "", []
+        if t0 is not None:
+            where += " AND timestamp >= ?"
+            parameters.append(t0)
+        if t1 is not None:
+            where += " AND timestamp < ?"
+            parameters.append(t1)
+        return self._sessions_query(pair, where, parameters)
+
+    def last_sessions(self, pair, count):
+        """ Returns a ScoreHistory with the pair's most recent count sessions """
+        return self._sessions_query(pair, "", [], "DESC", count)
+
+    def best_score(self, pair, t0=None, t1=None):
+        """
+            Highest score for the pair in sessions where t0 <= timestamp < t1,
+            or None if it wasn't played in that time.
+        """
+        return self.sessions(pair, t0, t1).high()
+
+    # SQLite date modifiers for the start of the day / week (Monday) / month a timestamp is in
+    ROLLUP_BUCKETS = {
+            "day": "'start of day'",
+            "week": "'start of day', '-6 days', 'weekday 1'",
+            "month": "'start of month'",
+        }
+
+    def rollup(self, resolution, pair=None, t0=None, t1=None):
+        """
+            Same rows as ChordData.rollup - (bucket start, count, high, mean, total)
+            for each day, week or month that starts in [t0, t1) - grouped by SQLite.
+        """
+        bucket = f"strftime('%s', timestamp, 'unixepoch', 'localtime', {self.ROLLUP_BUCKETS[resolution]}, 'utc')"
+        where, parameters = "", []
+        if pair is not None:
+            pair_id = self._pair_id(pair)
+            if pair_id is None:
+                raise KeyError(pair)
+            where += " AND pair_id = ?"
+            parameters.append(pair_id)
+        rows = self._db.execute(
+            f"SELECT CAST({bucket} AS REAL) AS start, COUNT(*), MAX(score), AVG(score), SUM(score) "
+            f"FROM sessions WHERE 1 {where} GROUP BY start ORDER BY start", parameters
+        )
+        return [row for row in rows if (t0 is None or row[0] >= t0) and (t1 is None or row[0] < t1)]
+
+    def stats(self, pair):
+        """
+            Returns a PairStats for the given pair built by a single aggregate query.
+            Pairs that were never played get empty stats.
+        """
+        pair_id = self._pair_id(pair)
+        if pair_id is None:
+            raise KeyError(pair)
+        row = self._db.execute(
+            "SELECT COALESCE(MAX(score), 0), COALESCE(SUM(score), 0), COUNT(*), MIN(timestamp), MAX(timestamp) "
+            "FROM sessions WHERE pair_id = ?", (pair_id,)
+        ).fetchone()
+        stats = PairStats()
+        stats.high, stats.total, stats.count, stats.first, stats.last = row
+        return stats
+
+    def add_chord(self, chord):
+        """
+            Add chord and all of the new chord pairs it makes in one transaction.
+            The pairs don't get any sessions until they are played.
+
+            returns
+                the chord if it was added
+                False if chord is valid but already known
+                None if chord is invalid
+        """
+        chord = parse_chord(chord)
+        if not chord:
+            return None
+        with self._db:
+            if self._db.execute("SELECT 1 FROM chords WHERE name = ?", (chord,)).fetchone():
+                return False
+            new_pairs = []
+            for old_chord in self.chords:
+                pair = (chord, old_chord) if chord < old_chord else (old_chord, chord)
+                self._db.execute("INSERT INTO pairs (chord_a, chord_b) VALUES (?, ?)", pair)
+                new_pairs.append(pair)
+            self._db.execute("INSERT INTO chords (name) VALUES (?)", (chord,))
+        if self._scheduler is not None:
+            for pair in new_pairs:
+                self._schedule_index[pair] = self._scheduler.add()
+                self._schedule_pairs.append(pair)
+        self._notify("chord", chord, new_pairs)
+        return chord
+
+    def add_score(self, pair, score, timestamp=None):
+        """
+        Adds the score the the chord pair's sessions
+        Raises ValueError if the score is not a whole number from 0 to history.MAX_SCORE
+        """
+        check_score(score)
+        pair = tuple(sorted(pair))
+        if timestamp == None:
+            timestamp = time.time()
+        with self._db:
+            pair_id = self._pair_id(pair)
+            if pair_id is None:
+                raise IndexError(f"Key not found {pair}")
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (pair_id, timestamp, score) VALUES (?, ?, ?)",
+                (pair_id, timestamp, score),
+            )
+        if self._scheduler is not None:
+            self._scheduler.reset(self._schedule_index[pair], self.sessions(pair))
+        self._notify("score", pair)
+        return True
+
+    def _get_scheduler(self):
+        """ Same as ChordData._get_scheduler, the scheduler numbers the pairs in the order they were made """
+        if self._scheduler is None:
+            self._schedule_pairs = list(self.pairs())
+            self._schedule_index = {pair: index for index, pair in enumerate(self._schedule_pairs)}
+            self._scheduler = Scheduler(self.sessions(pair) for pair in self._schedule_pairs)
+        return self._scheduler
+
+    def next_due(self):
+        """ Returns the pair that is due to be practiced soonest (see scheduler.py) """
+        scheduler = self._get_scheduler()
+        return self._schedule_pairs[scheduler.next_due()[0]]
+
+    def due_pairs(self, now=None):
+        """ Returns [(pair, due time)] for every pair that is due by now, soonest first """
+        scheduler = self._get_scheduler()
+        return [(self._schedule_pairs[index], due) for index, due in scheduler.due(now)]
+
+    def due_time(self, pair):
+        """ When the pair is due to be practiced next, 0 if it was never played """
+        return self._get_scheduler().due_time(self._schedule_index[tuple(sorted(pair))])
+
+    def random_key(self):
+        """
+            Pick a random pair with even distribution
+        """
+        count = len(self.scores)
+        return tuple(self._db.execute(
+            "SELECT chord_a, chord_b FROM pairs ORDER BY id LIMIT 1 OFFSET ?", (random.randrange(count),)
+        ).fetchone())
+
+    def _all_stats(self):
+        """ Returns [(pair, PairStats)] for every pair, all from one GROUP BY query """
+        rows = self._db.execute(
+            "SELECT chord_a, chord_b, COALESCE(MAX(score), 0), COALESCE(SUM(score), 0), COUNT(score), "
+            "MIN(timestamp), MAX(timestamp) FROM pairs LEFT JOIN sessions ON pairs.id = sessions.pair_id "
+            "GROUP BY pairs.id ORDER BY pairs.id"
+        )
+        found = []
+        for chord_a, chord_b, *row in rows:
+            stats = PairStats()
+            stats.high, stats.total, stats.count, stats.first, stats.last = row
+            found.append(((chord_a, chord_b), stats))
+        return found
+
+    def weighted_random(self, offset=5):
+        """
+            Same weighting as ChordData.weighted_random: each pair's chance is
+            proportional to 1 / (<high score> + offset + 1), or to the function
+            given to set_weighting.
+        """
+        return self.weighted_randoms(1, offset)[0]
+
+    def weighted_randoms(self, count, offset=5):
+        """
+            Returns a list of count keys chosen the same way as weighted_random.
+            The weights come from the database every call so nothing has to be kept up to date.
+        """
+        weight = self._weighting if self._weighting is not None else highscore_weight(offset)
+        found = self._all_stats()
+        if not found:
+            raise IndexError("There are no chord pairs to pick from")
+        return self._rng.choices([pair for pair, _ in found], [weight(stats) for _, stats in found], k=count)
+
+    def set_weighting(self, weight=None, seed=None):
+        """ See ChordData.set_weighting """
+        self._weighting = weight
+        self._rng = random.Random(seed)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, value, traceback):
+        # Every change was committed when it was made
+        self.close()
+        if traceback is not None:
+            raise Exception(error_type, value, traceback)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}('{self._file}')"
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(Chords: {len(self.chords)}, Pairs: {len(self.scores)})"
+
+
+def migrate(json_file, db_file):
+    """
+        Copy a JSON save file (like mychords.txt) into a new SQLite database.
+        Everything is inserted in a single transaction.
+    """
+    source = ChordData(json_file)
+    data = SQLChordData(db_file)
+    with data._db:
+        data._db.executemany("INSERT OR IGNORE INTO chords (name) VALUES (?)", ((chord,) for chord in source.chords))
+        data._db.executemany("INSERT OR IGNORE INTO pairs (chord_a, chord_b) VALUES (?, ?)", source.pairs())
+        for pair, sessions in source.scores.items():
+            pair_id = data._pair_id(pair)
+            data._db.executemany(
+                "INSERT OR REPLACE INTO sessions (pair_id, timestamp, score) VALUES (?, ?, ?)",
+                ((pair_id, timestamp, score) for timestamp, score in sessions.items()),
+            )
+    return data
+
+
+if __name__ == "__main__":
+    # Usage: python chordsql.py mychords.txt mychords.db
+    if len(sys.argv) > 2:
+        with migrate(sys.argv[1], sys.argv[2]) as data:
+            print(f"Migrated {data}")
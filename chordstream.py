@@ -0,0 +1,117 @@
+"""
+    Reads a ChordData save file a piece at a time.
+
+    json.load has to hold the whole file and everything it decodes at once.
+    stream_profile reads the file in chunks and hands back one chord pair
+    at a time, so the only thing in memory besides the result is the pair
+    currently being decoded.
+"""
+import json
+import os
+
+CHUNK_SIZE = 64 * 1024
+
+# Decodes {timestamp: score} objects as a list of (timestamp, score) tuples
+# so no dict is made just to be thrown away
+_decoder = json.JSONDecoder(object_pairs_hook=list)
+_whitespace = " \t\n\r"
+
+
+class ProfileReader:
+    """
+        Keeps a buffer of the file and decodes one JSON value from it at a time.
+        The part of the buffer that was already decoded is thrown away.
+    """
+
+    def __init__(self, savefile, progress=None, chunk_size=CHUNK_SIZE):
+        self.savefile = savefile
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.total = os.fstat(savefile.fileno()).st_size
+        self.bytes_read = 0
+        self.buffer = ""
+        self.pos = 0
+        self.done = False
+
+    def _read(self, size=None):
+        """ Add the next chunk to the buffer. Returns False at the end of the file """
+        if self.done:
+            return False
+        chunk = self.savefile.read(size or self.chunk_size)
+        if not chunk:
+            self.done = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.bytes_read += len(chunk.encode("utf-8")) if not chunk.isascii() else len(chunk)
+        if self.progress is not None:
+            self.progress(min(self.bytes_read, self.total), self.total)
+        return True
+
+    def peek(self):
+        """ Returns the next character that isn't whitespace without using it up """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                raise ValueError("Unexpected end of save file")
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError(f"Expected {character!r} at byte {self.bytes_read} of save file")
+        self.pos += 1
+
+    def value(self):
+        """
+            Decode the next JSON value. Only use this for strings, lists and objects,
+            a number at the end of the buffer could be cut off and still decode.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value doesn't fit in the buffer yet. Read at least as much as is
+                # already buffered so a huge value isn't decoded over and over again.
+                if not self._read(max(self.chunk_size, len(self.buffer) - self.pos)):
+                    raise
+                continue
+            self.pos = end
+            return value
+
+
+def stream_profile(file, progress=None, chunk_size=CHUNK_SIZE):
+    """
+        Reads a save file in the [chords, {"A&B": {timestamp: score}}] format.
+
+        Yields the list of chords first, then a (key, sessions) tuple for every
+        chord pair where sessions is a list of (timestamp string, score) tuples.
+
+        progress is called with (bytes read, file size) after every chunk.
+    """
+    with open(file, "r") as savefile:
+        reader = ProfileReader(savefile, progress, chunk_size)
+        if reader.total == 0:
+            yield []
+            return
+        reader.expect("[")
+        yield reader.value()
+        reader.expect(",")
+        reader.expect("{")
+        if reader.peek() == "}":
+            reader.pos += 1
+        else:
+            while True:
+                key = reader.value()
+                reader.expect(":")
+                yield key, reader.value()
+                if reader.peek() == ",":
+                    reader.pos += 1
+                else:
+                    reader.expect("}")
+                    break
+        reader.expect("]")
+        if progress is not None:
+            progress(reader.total, reader.total)
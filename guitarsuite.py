@@ -1,55 +1,187 @@
-from chorddata import ChordData
-from chordchanges import ChordChanges
-from userprogress import UserProgress
+import time
+# Taken before anything else is imported so the startup timeline includes imports
+START_TIME = time.perf_counter()
 
+import argparse
+import os
 import sys
 
-from PyQt5.QtWidgets import QWidget, QTabWidget, QVBoxLayout, QApplication
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QWidget, QTabWidget, QVBoxLayout, QApplication, QProgressDialog, QLabel
+
+from autosave import AutoSaver
+from chorddata import ChordData
+import instrument
+import util
+
+
+class StartupTimeline:
+    """
+        Records how long each step of starting the program takes.
+        Turn it on with --startup-timing or the GUITARSUITE_STARTUP_TIMING environment variable.
+    """
+
+    def __init__(self, enabled=False, start=START_TIME):
+        self.enabled = enabled
+        self.last = start
+        self.start = start
+        self.steps = []
+
+    def mark(self, step):
+        """ Record the time since the last mark as step """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.steps.append((step, now - self.last))
+        self.last = now
+
+    def report(self, file=sys.stderr):
+        if not self.enabled:
+            return
+        for step, seconds in self.steps:
+            print(f"{step:<20}{seconds * 1000:>10.1f} ms", file=file)
+        print(f"{'total':<20}{(self.last - self.start) * 1000:>10.1f} ms", file=file)
+
+
+class InstrumentOverlay(QLabel):
+    """
+        Shows the instrumented methods that have taken the most time so far
+        in the corner of its parent. Mouse clicks go through to the widgets under it.
+    """
+
+    def __init__(self, parent, interval=1000):
+        super(InstrumentOverlay, self).__init__(parent)
+        self.setFont(QFont("Hack", 9))
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: white; padding: 4px;")
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(interval)
+        self.refresh()
+
+    def refresh(self):
+        lines = instrument.summary()
+        self.setText("\n".join(lines) if lines else "No instrumented calls yet")
+        self.adjustSize()
+        self.move(self.parent().width() - self.width() - 8, 8)
+        self.raise_()
 
 
 class GuitarSuite(QWidget):
-    """ Main application for the guitar suite program """
+    """ Main application for the guitar suite program
 
-    def __init__(self, data, *args, **kwargs):
+        Each tab is only built the first time it is shown so starting up
+        doesn't have to build the pair grid and the stats table.
+    """
+
+    def __init__(self, data, *args, timeline=None, **kwargs):
         super(GuitarSuite, self).__init__(*args, **kwargs)
         self.setWindowTitle("Guitar Suite")
         self.data = data
+        self.timeline = timeline
         self.vbox = QVBoxLayout(self)
 
         self.nav = QTabWidget()
 
-        self.chordchanges = ChordChanges(self.data)
-        self.userprogress = UserProgress(self.data)
-
-        self.nav.addTab(self.chordchanges, "&Chord Changes")
-        self.nav.addTab(self.userprogress, "&My Progress")
+        self.chordchanges = None
+        self.userprogress = None
+        # Empty pages that the real widgets get put in when they are needed
+        self.pages = [QWidget(), QWidget()]
+        for page in self.pages:
+            QVBoxLayout(page).setContentsMargins(0, 0, 0, 0)
 
-        self.nav.currentChanged.connect(self.reload_widget)
+        self.nav.addTab(self.pages[0], "&Chord Changes")
+        self.nav.addTab(self.pages[1], "&My Progress")
 
         self.vbox.addWidget(self.nav)
 
         if self.data.chords == []:
-            self.nav.setCurrentWidget(self.userprogress)
+            self.nav.setCurrentIndex(1)
+        self.build_page(self.nav.currentIndex())
+
+        self.nav.currentChanged.connect(self.reload_widget)
+
+        self.overlay = InstrumentOverlay(self) if instrument.enabled() else None
+
+    def build_page(self, page):
+        """ Makes the widget for a tab if it hasn't been made yet. Returns True if it was made """
+        if page == 0 and self.chordchanges is None:
+            from chordchanges import ChordChanges
+            self.chordchanges = ChordChanges(self.data)
+            self.pages[0].layout().addWidget(self.chordchanges)
+            return True
+        elif page == 1 and self.userprogress is None:
+            from userprogress import UserProgress
+            self.userprogress = UserProgress(self.data)
+            self.pages[1].layout().addWidget(self.userprogress)
+            return True
+        return False
 
     def reload_widget(self, page):
+        # The stats table on the My Progress page updates itself as scores come in
+        if self.build_page(page):
+            return
         if page == 0:
             self.chordchanges.refresh()
-        elif page == 1:
-            self.userprogress.display_stats()
 
-
-def main(filename):
-    with ChordData(filename) as chord_data:
-        app = QApplication([])
-        gs = GuitarSuite(chord_data)
-        with open("guitarsuite_styles.qss") as styles:
-            gs.setStyleSheet(styles.read())
+    def paintEvent(self, e):
+        super(GuitarSuite, self).paintEvent(e)
+        if self.timeline is not None:
+            self.timeline.mark("first paint")
+            self.timeline.report()
+            self.timeline = None
+
+
+def open_data(filename, progress=None):
+    """ SQLite databases (*.db) use SQLChordData, everything else is a JSON save file """
+    if filename is not None and filename.endswith(".db"):
+        from chordsql import SQLChordData
+        return SQLChordData(filename)
+    return ChordData(filename, journal=True, progress=progress)
+
+
+def load_progress(app):
+    """
+        Makes a progress callback for ChordData that shows a progress dialog
+        if loading the save file takes more than half a second.
+    """
+    dialog = QProgressDialog("Loading your chords...", None, 0, 100)
+    dialog.setWindowTitle("Guitar Suite")
+    dialog.setMinimumDuration(500)
+
+    def progress(done, total):
+        dialog.setValue(done * 100 // total if total else 100)
+        app.processEvents()
+    return progress
+
+
+def main(filename, timeline=None):
+    if timeline is None:
+        timeline = StartupTimeline()
+    timeline.mark("import")
+    app = QApplication([])
+    with open_data(filename, load_progress(app)) as chord_data:
+        timeline.mark("data load")
+        # SQLite commits every score itself. JSON and binary profiles are in journal mode,
+        # so the AutoSaver only compacts the journal in the background once it gets long
+        saver = AutoSaver(chord_data) if isinstance(chord_data, ChordData) else None
+        gs = GuitarSuite(chord_data, timeline=timeline if timeline.enabled else None)
+        gs.setStyleSheet(util.app_stylesheet())
+        timeline.mark("widgets")
         gs.show()
         app.exec_()
+        if saver is not None:
+            saver.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        main(sys.argv[1])
-    else:
-        main(None)
-
+    parser = argparse.ArgumentParser(description="Guitar practice suite")
+    parser.add_argument("file", nargs="?", default=None, help="save file (*.db files use SQLite)")
+    parser.add_argument("--startup-timing", action="store_true", help="print how long each step of starting up takes")
+    parser.add_argument("--instrument", nargs="?", const=instrument.DEFAULT_REPORT, metavar="REPORT",
+                        help=f"time the slow parts of the program and write a JSON report on exit (default {instrument.DEFAULT_REPORT})")
+    args = parser.parse_args()
+    if args.instrument:
+        instrument.enable(args.instrument)
+    enabled = args.startup_timing or bool(os.environ.get("GUITARSUITE_STARTUP_TIMING"))
+    main(args.file, StartupTimeline(enabled))
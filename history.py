@@ -0,0 +1,177 @@
+"""
+    Compact storage for one chord pair's session history.
+
+    A dict of {timestamp: score} costs over 100 bytes per session. ScoreHistory
+    keeps the timestamps and scores in two arrays (8 bytes + 2 bytes per session)
+    sorted by time, and still acts like a dict so code that does
+    scores[pair][timestamp] or scores[pair].values() keeps working.
+
+    If NumPy is installed the aggregates use it, otherwise they fall back to
+    the builtins which still run over the raw arrays.
+"""
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAX_SCORE = 65535
+
+
+def check_score(score):
+    """ Raises ValueError unless score is a whole number ScoreHistory can store """
+    if not isinstance(score, int) or not 0 <= score <= MAX_SCORE:
+        raise ValueError(f"Scores have to be whole numbers from 0 to {MAX_SCORE}, not {score!r}")
+
+
+class ScoreHistory(MutableMapping):
+    """
+        Sorted timestamp -> score mapping backed by array('d') and array('H').
+        Scores have to fit in an unsigned 16 bit int (0 - MAX_SCORE).
+    """
+
+    __slots__ = ("_times", "_scores")
+
+    def __init__(self, sessions=None):
+        self._times = array("d")
+        self._scores = array("H")
+        if sessions:
+            items = sessions.items() if hasattr(sessions, "items") else sessions
+            for timestamp, score in sorted(items):
+                self[timestamp] = score
+
+    @classmethod
+    def from_arrays(cls, times, scores):
+        """
+            Wrap arrays that are already sorted by time without copying them.
+            They can also be read only memoryviews, they are copied the first time they change.
+        """
+        history = cls()
+        history._times = times
+        history._scores = scores
+        return history
+
+    @property
+    def times(self):
+        return self._times
+
+    @property
+    def score_array(self):
+        return self._scores
+
+    def __len__(self):
+        return len(self._times)
+
+    def __iter__(self):
+        return iter(self._times)
+
+    def __contains__(self, timestamp):
+        i = bisect_left(self._times, timestamp)
+        return i < len(self._times) and self._times[i] == timestamp
+
+    def __getitem__(self, timestamp):
+        i = bisect_left(self._times, timestamp)
+        if i < len(self._times) and self._times[i] == timestamp:
+            return self._scores[i]
+        raise KeyError(timestamp)
+
+    def _own(self):
+        """
+            Copy the arrays before changing them if they are read only views
+            (like the memoryviews into a mapped binary snapshot)
+        """
+        if not isinstance(self._times, array):
+            self._times = array("d", self._times)
+            self._scores = array("H", self._scores)
+
+    def __setitem__(self, timestamp, score):
+        self._own()
+        # Sessions almost always arrive in order so check the end first
+        if not self._times or timestamp > self._times[-1]:
+            i = len(self._times)
+        else:
+            i = bisect_left(self._times, timestamp)
+            if self._times[i] == timestamp:
+                self._scores[i] = score
+                return
+        # The score goes in first so if array('H') rejects it nothing has changed,
+        # and it is taken back out if the timestamp is rejected, so the arrays always line up
+        self._scores.insert(i, score)
+        try:
+            self._times.insert(i, timestamp)
+        except TypeError:
+            del self._scores[i]
+            raise
+
+    def __delitem__(self, timestamp):
+        self._own()
+        i = bisect_left(self._times, timestamp)
+        if i < len(self._times) and self._times[i] == timestamp:
+            del self._times[i]
+            del self._scores[i]
+        else:
+            raise KeyError(timestamp)
+
+    def copy(self):
+        """
+            Returns a ScoreHistory that won't see later changes to this one.
+            Read only views are shared since nothing can change them.
+        """
+        if isinstance(self._times, array):
+            return self.from_arrays(array("d", self._times), array("H", self._scores))
+        return self.from_arrays(self._times, self._scores)
+
+    def values(self):
+        return self._scores
+
+    def items(self):
+        return zip(self._times, self._scores)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self.items())})"
+
+    def _range(self, t0=None, t1=None):
+        """ Indexes of the sessions with t0 <= timestamp < t1 """
+        start = 0 if t0 is None else bisect_left(self._times, t0)
+        end = len(self._times) if t1 is None else bisect_left(self._times, t1)
+        return start, end
+
+    def between(self, t0=None, t1=None):
+        """ Returns a new ScoreHistory with the sessions where t0 <= timestamp < t1 """
+        start, end = self._range(t0, t1)
+        return self.from_arrays(self._times[start:end], self._scores[start:end])
+
+    def tail(self, count):
+        """ Returns a new ScoreHistory with the last count sessions """
+        start = max(0, len(self._times) - count)
+        return self.from_arrays(self._times[start:], self._scores[start:])
+
+    def count(self, t0=None, t1=None):
+        start, end = self._range(t0, t1)
+        return end - start
+
+    def high(self, t0=None, t1=None):
+        """ Highest score in the range, or None if there are no sessions in it """
+        start, end = self._range(t0, t1)
+        if start == end:
+            return None
+        if numpy is not None:
+            return int(numpy.frombuffer(self._scores, dtype=numpy.uint16)[start:end].max())
+        return max(self._scores[start:end])
+
+    def total(self, t0=None, t1=None):
+        start, end = self._range(t0, t1)
+        if start == end:
+            return 0
+        if numpy is not None:
+            return int(numpy.frombuffer(self._scores, dtype=numpy.uint16)[start:end].sum(dtype=numpy.int64))
+        return sum(self._scores[start:end])
+
+    def first(self):
+        return self._times[0] if self._times else None
+
+    def last(self):
+        return self._times[-1] if self._times else None
@@ -0,0 +1,279 @@
+""" Chart of the scores of one chord pair, or of every pair by day, over time.
+
+    Years of sessions are far more points than the chart is pixels wide, so
+    before drawing the visible part of each line is cut down to about one point
+    per pixel with Largest-Triangle-Three-Buckets, which keeps the peaks and
+    dips that a plain average would flatten.
+
+    Drawing happens on a QThreadPool thread into a QImage. While zooming or
+    panning the last image is just stretched and moved to where it belongs, and
+    a new one is drawn once the mouse stops for a moment, so the chart keeps up
+    with the mouse no matter how many sessions there are.
+
+    Scroll to zoom, drag to pan, double click to see everything again.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import time
+
+from PyQt5.QtCore import Qt, QObject, QPointF, QRectF, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QWidget
+import util
+
+# Shortest time span the chart can be zoomed into, in seconds
+MIN_SPAN = 60 * 60
+# Draw a new image after the view hasn't changed for this many milliseconds
+RENDER_DELAY = 40
+
+
+def lttb(times, values, threshold):
+    """
+        Largest-Triangle-Three-Buckets downsampling.
+        Returns (times, values) lists with at most threshold points, always
+        keeping the first and the last one.
+    """
+    count = len(times)
+    if threshold >= count or threshold < 3:
+        return list(times), list(values)
+    sampled_times, sampled_values = [times[0]], [values[0]]
+    every = (count - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        if next_start >= next_end:
+            next_start, next_end = count - 1, count
+        average_time = sum(times[next_start:next_end]) / (next_end - next_start)
+        average_value = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        a_time, a_value = times[a], values[a]
+        largest, chosen = -1.0, start
+        for j in range(start, end):
+            area = abs((a_time - average_time) * (values[j] - a_value)
+                       - (a_time - times[j]) * (average_value - a_value))
+            if area > largest:
+                largest, chosen = area, j
+        sampled_times.append(times[chosen])
+        sampled_values.append(values[chosen])
+        a = chosen
+    sampled_times.append(times[-1])
+    sampled_values.append(values[-1])
+    return sampled_times, sampled_values
+
+
+class RenderSignals(QObject):
+    # generation, image, start and end time the image covers
+    finished = pyqtSignal(int, QImage, float, float)
+
+
+class ChartRender(QRunnable):
+    """
+        Draws the lines of the chart into a QImage on a worker thread.
+        series is a list of (times, values, color, line width). Nothing in it
+        is changed after it is handed over so it can be read here safely.
+    """
+
+    def __init__(self, signals, generation, series, t0, t1, width, height, y_max):
+        super(ChartRender, self).__init__()
+        self.signals = signals
+        self.generation = generation
+        self.series = series
+        self.t0, self.t1 = t0, t1
+        self.width, self.height = width, height
+        self.y_max = y_max
+
+    def run(self):
+        image = QImage(self.width, self.height, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        x_scale = self.width / (self.t1 - self.t0)
+        y_scale = (self.height - 1) / self.y_max
+        for times, values, color, line_width in self.series:
+            # One point past each edge so the line runs off the side instead of stopping short
+            start = max(0, bisect_left(times, self.t0) - 1)
+            end = min(len(times), bisect_right(times, self.t1) + 1)
+            if end - start < 1:
+                continue
+            xs, ys = lttb(times[start:end], values[start:end], self.width)
+            points = QPolygonF([QPointF((t - self.t0) * x_scale, self.height - 1 - v * y_scale) for t, v in zip(xs, ys)])
+            painter.setPen(QPen(QColor(color), line_width))
+            if len(xs) == 1:
+                painter.drawPoint(points[0])
+            else:
+                painter.drawPolyline(points)
+        painter.end()
+        self.signals.finished.emit(self.generation, image, self.t0, self.t1)
+
+
+class HistoryChart(QWidget):
+    """
+        Shows one pair's sessions (set_pair) or, with no pair, every pair's
+        best and average score by day (from ChordData.rollup so the sessions
+        themselves are not read).
+    """
+
+    def __init__(self, data, *args, **kwargs):
+        super(HistoryChart, self).__init__(*args, **kwargs)
+        self.data = data
+        self.pair = None
+        self.series = []
+        self.full_range = (0.0, 1.0)
+        self.view = self.full_range
+        self.y_max = 1
+
+        self.image = None
+        self.image_range = None
+        self.generation = 0
+        self.shown_generation = -1
+        self.signals = RenderSignals()
+        self.signals.finished.connect(self.rendered)
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(RENDER_DELAY)
+        self.render_timer.timeout.connect(self.render)
+        self.drag_start = None
+
+        self.setMinimumHeight(200)
+        data.add_listener(self.data_changed)
+        self.load()
+
+    def set_pair(self, pair):
+        """ Show the sessions of pair, or every pair by day if pair is None """
+        self.pair = pair
+        self.load()
+
+    def load(self, keep_view=False):
+        """ Read the lines to draw from the ChordData object """
+        daily = self.data.rollup("day")
+        # Put each day's point at noon so it sits in the middle of the day
+        day_times = [start + 12 * 60 * 60 for start, count, high, mean, total in daily]
+        day_means = [mean for start, count, high, mean, total in daily]
+        if self.pair is None:
+            day_highs = [high for start, count, high, mean, total in daily]
+            self.series = [
+                (day_times, day_highs, util.BUCKET_COLORS["mastery"], 2),
+                (day_times, day_means, util.BUCKET_COLORS["okay"], 1.5),
+            ]
+            values = day_highs
+        else:
+            sessions = self.data.sessions(self.pair)
+            # Every pair's average by day in the background to compare against
+            self.series = [
+                (day_times, day_means, "#888888", 1),
+                (sessions.times, sessions.score_array, util.BUCKET_COLORS["mastery"], 2),
+            ]
+            values = sessions.score_array
+        ends = [t for times, *style in self.series if len(times) for t in (times[0], times[-1])]
+        was_full = self.view == self.full_range
+        if ends:
+            self.full_range = (min(ends) - 12 * 60 * 60, max(ends) + 12 * 60 * 60)
+        else:
+            now = time.time()
+            self.full_range = (now - 30 * 24 * 60 * 60, now)
+        self.y_max = max(max(values, default=0), max(day_means, default=0), 1) * 1.1
+        if not keep_view or was_full:
+            self.view = self.full_range
+        if not keep_view:
+            # The old image is for another pair, don't stretch it over this one
+            self.image = None
+        self.request_render()
+
+    def data_changed(self, event, *args):
+        if event == "score" and (self.pair is None or args[0] == self.pair):
+            self.load(keep_view=True)
+
+    def plot_rect(self):
+        """ Where the lines go, leaving room for the labels """
+        return QRectF(40, 8, max(1, self.width() - 48), max(1, self.height() - 28))
+
+    def request_render(self):
+        self.generation += 1
+        self.update()
+        self.render_timer.start()
+
+    def render(self):
+        plot = self.plot_rect()
+        t0, t1 = self.view
+        QThreadPool.globalInstance().start(ChartRender(
+            self.signals, self.generation, self.series, t0, t1,
+            int(plot.width()), int(plot.height()), self.y_max,
+        ))
+
+    def rendered(self, generation, image, t0, t1):
+        # A slower render of an older view can finish after a newer one
+        if generation <= self.shown_generation:
+            return
+        self.shown_generation = generation
+        self.image = image
+        self.image_range = (t0, t1)
+        self.update()
+
+    def paintEvent(self, e):
+        painter = QPainter(self)
+        plot = self.plot_rect()
+        painter.fillRect(plot, self.palette().base())
+        t0, t1 = self.view
+        if self.image is not None:
+            # Stretch and move the last image to the current view until the next one is ready
+            image_t0, image_t1 = self.image_range
+            x0 = plot.left() + (image_t0 - t0) / (t1 - t0) * plot.width()
+            x1 = plot.left() + (image_t1 - t0) / (t1 - t0) * plot.width()
+            painter.setClipRect(plot)
+            painter.drawImage(QRectF(x0, plot.top(), x1 - x0, plot.height()), self.image)
+            painter.setClipping(False)
+
+        painter.setPen(self.palette().text().color())
+        painter.drawRect(plot)
+        painter.drawText(QRectF(0, plot.top(), plot.left() - 4, 16), Qt.AlignRight, str(int(self.y_max)))
+        painter.drawText(QRectF(0, plot.bottom() - 16, plot.left() - 4, 16), Qt.AlignRight, "0")
+        date_format = "%y/%m/%d %H:%M" if t1 - t0 < 3 * 24 * 60 * 60 else "%y/%m/%d"
+        label_rect = QRectF(plot.left(), plot.bottom() + 2, plot.width(), 18)
+        painter.drawText(label_rect, Qt.AlignLeft, datetime.fromtimestamp(t0).strftime(date_format))
+        painter.drawText(label_rect, Qt.AlignRight, datetime.fromtimestamp(t1).strftime(date_format))
+        if not any(len(times) for times, values, color, width in self.series):
+            painter.drawText(plot, Qt.AlignCenter, "No sessions yet")
+
+    def resizeEvent(self, e):
+        super(HistoryChart, self).resizeEvent(e)
+        self.request_render()
+
+    def set_view(self, t0, t1):
+        """ Show t0 to t1, kept inside the history and no shorter than MIN_SPAN """
+        full_t0, full_t1 = self.full_range
+        span = min(max(t1 - t0, MIN_SPAN), full_t1 - full_t0)
+        t0 = min(max(t0, full_t0), full_t1 - span)
+        self.view = (t0, t0 + span)
+        self.request_render()
+
+    def time_at(self, x):
+        plot = self.plot_rect()
+        t0, t1 = self.view
+        return t0 + (x - plot.left()) / plot.width() * (t1 - t0)
+
+    def wheelEvent(self, e):
+        factor = 0.8 ** (e.angleDelta().y() / 120)
+        t0, t1 = self.view
+        center = self.time_at(e.pos().x())
+        self.set_view(center - (center - t0) * factor, center + (t1 - center) * factor)
+
+    def mousePressEvent(self, e):
+        if e.button() == Qt.LeftButton:
+            self.drag_start = (e.pos().x(), self.view)
+
+    def mouseMoveEvent(self, e):
+        if self.drag_start is not None:
+            x, (t0, t1) = self.drag_start
+            shift = (x - e.pos().x()) / self.plot_rect().width() * (t1 - t0)
+            self.set_view(t0 + shift, t1 + shift)
+
+    def mouseReleaseEvent(self, e):
+        self.drag_start = None
+
+    def mouseDoubleClickEvent(self, e):
+        self.view = self.full_range
+        self.request_render()
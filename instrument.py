@@ -0,0 +1,158 @@
+"""
+    Opt-in timing of the slow parts of the program.
+
+    Modules list the methods worth watching with watch(). Nothing is wrapped
+    until instrumentation is turned on, so it costs nothing when it is off.
+    Turn it on with the GUITARSUITE_INSTRUMENT environment variable (set it to
+    a file name for the report, or to 1 for instrument.json) or with
+    guitarsuite.py --instrument.
+
+    For each watched method it records the number of calls, the total time,
+    latency percentiles and how much memory the calls allocated (tracemalloc).
+    The report is written as JSON when the program exits.
+"""
+import atexit
+from array import array
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+DEFAULT_REPORT = "instrument.json"
+# Percentiles are worked out from at most this many latencies per method
+SAMPLE_SIZE = 10000
+
+_enabled = False
+_memory = False
+_report_file = None
+_watched = []
+_stats = {}
+
+
+class CallStats:
+    """ What has been recorded for one method """
+    __slots__ = ("count", "total", "max", "allocated", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.allocated = 0
+        self.samples = array("d")
+
+    def record(self, seconds, allocated):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.allocated += allocated
+        # Reservoir sampling keeps the percentiles fair without keeping every call
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(seconds)
+        else:
+            i = random.randrange(self.count)
+            if i < SAMPLE_SIZE:
+                self.samples[i] = seconds
+
+    def as_dict(self):
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000 if ordered else 0.0
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": percentile(50),
+            "p90_ms": percentile(90),
+            "p99_ms": percentile(99),
+            "max_ms": self.max * 1000,
+            "allocated_bytes": self.allocated,
+        }
+
+
+def enabled():
+    return _enabled
+
+
+def _wrap(owner, name):
+    function = getattr(owner, name)
+    label = f"{owner.__name__}.{name}"
+    stats = _stats.setdefault(label, CallStats())
+    # Qt passes signal arguments (like clicked's checked) to slots that don't take
+    # them and drops them itself. It can't see through this wrapper, so the
+    # wrapper drops them instead.
+    code = function.__code__
+    max_args = None if code.co_flags & inspect.CO_VARARGS else code.co_argcount
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if max_args is not None:
+            args = args[:max_args]
+        before = tracemalloc.get_traced_memory()[0] if _memory else 0
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            allocated = tracemalloc.get_traced_memory()[0] - before if _memory else 0
+            stats.record(seconds, allocated)
+    wrapper.__instrumented__ = function
+    setattr(owner, name, wrapper)
+
+
+def watch(owner, *names):
+    """ Record calls to the named methods of the class owner once instrumentation is on """
+    for name in names:
+        _watched.append((owner, name))
+        if _enabled:
+            _wrap(owner, name)
+
+
+def enable(report_file=DEFAULT_REPORT, memory=True):
+    """
+        Start recording. The report is written to report_file when the program
+        exits (None to not write one). memory turns on tracemalloc, which makes
+        everything slower but shows how much each call allocated.
+    """
+    global _enabled, _memory, _report_file
+    if _enabled:
+        return
+    _enabled = True
+    _report_file = report_file
+    if memory:
+        _memory = True
+        tracemalloc.start()
+    for owner, name in _watched:
+        _wrap(owner, name)
+    atexit.register(_write_report)
+
+
+def report():
+    """ Returns {method: stats dict} for every method that has been called """
+    return {label: stats.as_dict() for label, stats in _stats.items() if stats.count}
+
+
+def summary(count=8):
+    """ Lines with the methods that took the most time in total, for the GUI overlay """
+    rows = sorted(report().items(), key=lambda item: item[1]["total_ms"], reverse=True)[:count]
+    return [f"{label:<32}{stats['count']:>7}{stats['total_ms']:>10.1f} ms{stats['p90_ms']:>9.2f} ms p90"
+            for label, stats in rows]
+
+
+def _write_report():
+    if _report_file is None:
+        return
+    try:
+        with open(_report_file, "w") as report_file:
+            json.dump({"time": time.time(), "argv": sys.argv, "methods": report()}, report_file, indent=2)
+    except OSError as error:
+        print(f"Could not write instrumentation report {_report_file}: {error}", file=sys.stderr)
+
+
+if os.environ.get("GUITARSUITE_INSTRUMENT"):
+    _setting = os.environ["GUITARSUITE_INSTRUMENT"]
+    enable(DEFAULT_REPORT if _setting == "1" else _setting)
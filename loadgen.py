@@ -0,0 +1,165 @@
+"""
+    Load generator for service.py.
+
+    Opens --connections keep-alive connections to a running service and sends
+    a mix of reads (stats, random, weighted picks) and writes (scores) spread
+    over --profiles profiles for --duration seconds. Every profile gets
+    --chords chords first. At the end it prints the requests per second and
+    the latency percentiles, as JSON with --json.
+
+    Usage:
+        python service.py --dir /tmp/profiles &
+        python loadgen.py --port 8765 --connections 32 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from urllib.parse import urlencode
+
+from benchmark import chord_names
+
+
+class Connection:
+    """ One keep-alive HTTP/1.1 connection """
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+        )
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length, keep_alive = 0, True
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            if key.lower() == "content-length":
+                length = int(value)
+            elif key.lower() == "connection" and value.strip().lower() == "close":
+                keep_alive = False
+        response = json.loads(await self.reader.readexactly(length)) if length else None
+        if not keep_alive:
+            self.close()
+        return status, response
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else 0.0
+
+
+async def setup(host, port, profiles, chords):
+    """ Give every profile the same chords so there are pairs to play """
+    connection = Connection(host, port)
+    names = chord_names(chords)
+    for profile in profiles:
+        status, response = await connection.request("POST", f"/profiles/{profile}/chords", {"chords": names})
+        if status != 200:
+            raise RuntimeError(f"Could not set up {profile}: {status} {response}")
+    connection.close()
+    return names
+
+
+async def worker(host, port, profiles, names, write_ratio, deadline, latencies, errors, rng):
+    connection = Connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            profile = rng.choice(profiles)
+            a, b = rng.sample(names, 2)
+            roll = rng.random()
+            if roll < write_ratio:
+                request = ("POST", f"/profiles/{profile}/scores", {"pair": [a, b], "score": rng.randint(0, 60)})
+            elif roll < write_ratio + (1 - write_ratio) / 2:
+                request = ("GET", f"/profiles/{profile}/stats?{urlencode({'a': a, 'b': b})}", None)
+            else:
+                request = ("GET", f"/profiles/{profile}/{rng.choice(('random', 'weighted'))}", None)
+            start = time.perf_counter()
+            try:
+                status, response = await connection.request(*request)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as error:
+                errors.append(repr(error))
+                connection.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(f"{status} {response}")
+    finally:
+        connection.close()
+
+
+async def run(host, port, profiles=8, chords=20, connections=16, duration=10.0, write_ratio=0.2, seed=0):
+    profile_names = [f"loadgen-{i}" for i in range(profiles)]
+    names = await setup(host, port, profile_names, chords)
+    latencies, errors = [], []
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        worker(host, port, profile_names, names, write_ratio, deadline, latencies, errors, random.Random(rng.random()))
+        for _ in range(connections)
+    ))
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+            "p50": percentile(ordered, 50) * 1000,
+            "p90": percentile(ordered, 90) * 1000,
+            "p99": percentile(ordered, 99) * 1000,
+            "p999": percentile(ordered, 99.9) * 1000,
+            "max": ordered[-1] * 1000 if ordered else 0.0,
+        },
+        "parameters": {"profiles": profiles, "chords": chords, "connections": connections,
+                       "duration": duration, "write_ratio": write_ratio},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how fast service.py answers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profiles", type=int, default=8)
+    parser.add_argument("--chords", type=int, default=20, help="chords added to each profile before starting")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="fraction of requests that add a score")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    results = asyncio.run(run(args.host, args.port, args.profiles, args.chords, args.connections,
+                              args.duration, args.write_ratio, args.seed))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    latency = results["latency_ms"]
+    print(f"{results['requests']} requests in {results['seconds']:.1f} s, {results['errors']} errors")
+    print(f"{results['requests_per_second']:.0f} requests/s")
+    print(f"latency mean {latency['mean']:.2f} ms  p50 {latency['p50']:.2f}  p90 {latency['p90']:.2f}  "
+          f"p99 {latency['p99']:.2f}  p99.9 {latency['p999']:.2f}  max {latency['max']:.2f} ms")
+    for error in results["first_errors"]:
+        print("error:", error, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
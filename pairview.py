@@ -0,0 +1,220 @@
+""" Model/view version of the chord pair grid for profiles with a lot of chords.
+
+    ChordPairGrid makes one QPushButton per pair which gets really slow once there
+    are thousands of pairs. VirtualPairGrid keeps the pairs in a list model and
+    a delegate paints each cell, so only the cells that are on screen are drawn.
+"""
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QPainter
+from PyQt5.QtWidgets import (
+    QAbstractItemView,
+    QCheckBox,
+    QHBoxLayout,
+    QLabel,
+    QListView,
+    QRadioButton,
+    QStyle,
+    QStyledItemDelegate,
+    QVBoxLayout,
+    QWidget,
+)
+import instrument
+import util
+
+PairRole = Qt.UserRole
+ScoreRole = Qt.UserRole + 1
+
+
+class PairGridModel(QAbstractListModel):
+    """
+        One row per chord pair. The rows can be put in alphabetical or score
+        order without touching the data itself.
+        The model listens to the ChordData object so adding a chord only
+        inserts rows for the new pairs.
+    """
+
+    def __init__(self, data, *args, **kwargs):
+        super(PairGridModel, self).__init__(*args, **kwargs)
+        # Not self.data, that would hide QAbstractListModel.data
+        self.chord_data = data
+        self.reload()
+        data.add_listener(self.data_changed)
+
+    def reload(self):
+        """ Read every pair and its high score from the ChordData object """
+        self.beginResetModel()
+        self.pairs = list(self.chord_data.pairs())
+        self._ids = {pair: pair_id for pair_id, pair in enumerate(self.pairs)}
+        self.scores = [self.chord_data.highscore(pair) for pair in self.pairs]
+        self.order = list(range(len(self.pairs)))
+        self._rows = list(self.order)
+        self.endResetModel()
+
+    def data_changed(self, event, *args):
+        """ Listener for the ChordData object """
+        if event != "chord":
+            return
+        new_pairs = args[1]
+        if not new_pairs:
+            return
+        first = len(self.order)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_pairs) - 1)
+        for pair in new_pairs:
+            pair_id = len(self.pairs)
+            self.pairs.append(pair)
+            self._ids[pair] = pair_id
+            self.scores.append(self.chord_data.highscore(pair))
+            self._rows.append(len(self.order))
+            self.order.append(pair_id)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.order)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        pair_id = self.order[index.row()]
+        if role == Qt.DisplayRole:
+            return "+".join(self.pairs[pair_id])
+        elif role == Qt.ToolTipRole:
+            return f"High score: {self.scores[pair_id]}"
+        elif role == PairRole:
+            return self.pairs[pair_id]
+        elif role == ScoreRole:
+            return self.scores[pair_id]
+        return None
+
+    def arrange(self, by=None, reverse=False):
+        """
+            Put the rows in order.
+            by is "chords", "score" or None to leave the order alone.
+        """
+        if by == "chords":
+            key = self.pairs.__getitem__
+        elif by == "score":
+            key = self.scores.__getitem__
+        else:
+            return
+        self.layoutAboutToBeChanged.emit()
+        self.order = sorted(range(len(self.pairs)), key=key, reverse=reverse)
+        self._rows = [0] * len(self.order)
+        for row, pair_id in enumerate(self.order):
+            self._rows[pair_id] = row
+        self.layoutChanged.emit()
+
+    def set_score(self, pair, score):
+        """ Change one pair's score and repaint only its cell """
+        pair_id = self._ids[pair]
+        self.scores[pair_id] = score
+        index = self.index(self._rows[pair_id])
+        self.dataChanged.emit(index, index, [ScoreRole, Qt.ToolTipRole])
+
+
+class PairDelegate(QStyledItemDelegate):
+    """ Paints a cell to look like a PairButton """
+
+    def __init__(self, size, *args, **kwargs):
+        super(PairDelegate, self).__init__(*args, **kwargs)
+        self.size = QSize(*size)
+        self.font = QFont("Hack", 12)
+        self.font.setBold(True)
+
+    def sizeHint(self, option, index):
+        return self.size
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = QRect(option.rect.topLeft(), self.size)
+        color = util.bucket_color(index.data(ScoreRole))
+        background = QColor(color) if color else option.palette.button().color()
+        if option.state & QStyle.State_MouseOver:
+            background = background.lighter(120)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(background)
+        painter.drawRoundedRect(rect, 3, 3)
+        painter.setPen(option.palette.buttonText().color())
+        painter.setFont(self.font)
+        painter.drawText(rect, Qt.AlignCenter, index.data(Qt.DisplayRole))
+        painter.restore()
+
+
+class VirtualPairGrid(QWidget):
+    """
+        Drop in replacement for chordchanges.ChordPairGrid that uses a
+        QListView instead of one button per pair.
+    """
+
+    pair_clicked = pyqtSignal(tuple, int)
+
+    def __init__(self, data, *args, **kwargs):
+        super(VirtualPairGrid, self).__init__(*args, **kwargs)
+        self.data = data
+        self.button_size = (96, 36)
+        self.column_spacing = 8
+
+        self.layout = QVBoxLayout(self)
+
+        self.model = PairGridModel(data)
+        self.view = QListView()
+        self.view.setProperty("id", "gridcontainer")
+        self.view.setViewMode(QListView.IconMode)
+        self.view.setFlow(QListView.LeftToRight)
+        self.view.setWrapping(True)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setMovement(QListView.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.Batched)
+        self.view.setSpacing(self.column_spacing // 2)
+        self.view.setMouseTracking(True)
+        self.view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.view.setItemDelegate(PairDelegate(self.button_size, self.view))
+        self.view.setModel(self.model)
+        self.view.clicked.connect(self.emit_pair)
+
+        # Same controls as ChordPairGrid
+        sort_controls = QWidget()
+        self.sort_layout = QHBoxLayout(sort_controls)
+        sort_label = QLabel("Sort")
+        self.sort_alphabetically = QRadioButton("by Chords")
+        self.sort_alphabetically.clicked.connect(self.rearrange)
+        self.sort_numerically = QRadioButton("by Score")
+        self.sort_numerically.clicked.connect(self.rearrange)
+        self.reverse = QCheckBox("Reverse")
+        self.reverse.clicked.connect(self.rearrange)
+
+        self.sort_layout.addWidget(sort_label)
+        self.sort_layout.addWidget(self.sort_alphabetically)
+        self.sort_layout.addWidget(self.sort_numerically)
+        self.sort_layout.addWidget(self.reverse)
+
+        self.layout.addWidget(self.view)
+        self.layout.addWidget(sort_controls)
+
+    def emit_pair(self, index):
+        self.pair_clicked.emit(index.data(PairRole), index.data(ScoreRole))
+
+    def make_buttons(self):
+        """ The model adds new pairs itself, this only catches up if it somehow fell behind """
+        if len(self.model.pairs) != self.data.pair_count:
+            self.model.reload()
+
+    def new_pairs(self):
+        self.make_buttons()
+        self.rearrange()
+
+    def rearrange(self):
+        if self.sort_alphabetically.isChecked():
+            self.model.arrange("chords", self.reverse.isChecked())
+        elif self.sort_numerically.isChecked():
+            self.model.arrange("score", self.reverse.isChecked())
+
+    def update_score(self, pair, score):
+        self.model.set_score(pair, score)
+
+
+instrument.watch(VirtualPairGrid, "make_buttons", "rearrange")
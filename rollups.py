@@ -0,0 +1,192 @@
+"""
+    Per day, week and month totals of the practice history.
+
+    Charts and summaries only need the number of sessions and the best, total
+    and average score for each day / week / month, so those are kept up to date
+    as scores come in instead of being worked out from every session each time.
+    There is a set of totals for every pair and one for all pairs together.
+
+    The totals are saved next to the save file (mychords.txt.rollups). The
+    sidecar remembers the size and modification time of the save file it was
+    written with, and if they don't match anymore it is thrown away and the
+    totals are rebuilt from the sessions.
+"""
+from datetime import date, datetime
+import json
+import os
+import threading
+
+RESOLUTIONS = ("day", "week", "month")
+VERSION = 1
+
+# A cell is [count, high, total]
+COUNT, HIGH, TOTAL = 0, 1, 2
+
+
+def _key(resolution, day):
+    """ Bucket key for a date. Days and weeks are date ordinals, months count from year 0 """
+    if resolution == "day":
+        return day.toordinal()
+    if resolution == "week":
+        # Weeks start on Monday
+        return day.toordinal() - day.weekday()
+    return day.year * 12 + day.month - 1
+
+
+def _next(resolution, key):
+    """ Key of the bucket after key """
+    if resolution == "week":
+        return key + 7
+    return key + 1
+
+
+def bucket_start(resolution, key):
+    """ Timestamp of the start (local midnight) of a bucket """
+    if resolution == "month":
+        day = date(key // 12, key % 12 + 1, 1)
+    else:
+        day = date.fromordinal(key)
+    return datetime(day.year, day.month, day.day).timestamp()
+
+
+def bucket_keys(timestamp):
+    """ Returns the (day, week, month) keys for a timestamp in local time """
+    day = datetime.fromtimestamp(timestamp).date()
+    return tuple(_key(resolution, day) for resolution in RESOLUTIONS)
+
+
+class Rollups:
+    """
+        pairs[pair][resolution][key] and overall[resolution][key] are [count, high, total] cells
+    """
+
+    def __init__(self):
+        self.pairs = {}
+        self.overall = {resolution: {} for resolution in RESOLUTIONS}
+
+    @classmethod
+    def build(cls, scores):
+        """
+            Work out the totals from every session in scores ({pair: ScoreHistory}).
+            Sessions are sorted so the day only has to be looked up when it changes.
+        """
+        rollups = cls()
+        for pair, history in scores.items():
+            day_end = None
+            for timestamp, score in history.items():
+                if day_end is None or not day_start <= timestamp < day_end:
+                    keys = bucket_keys(timestamp)
+                    day_start = bucket_start("day", keys[0])
+                    day_end = bucket_start("day", keys[0] + 1)
+                rollups._add(pair, keys, score)
+        return rollups
+
+    def _add(self, pair, keys, score):
+        tables = self.pairs.get(pair)
+        if tables is None:
+            tables = self.pairs[pair] = {resolution: {} for resolution in RESOLUTIONS}
+        for resolution, key in zip(RESOLUTIONS, keys):
+            for table in (tables[resolution], self.overall[resolution]):
+                cell = table.get(key)
+                if cell is None:
+                    table[key] = [1, score, score]
+                else:
+                    cell[COUNT] += 1
+                    cell[TOTAL] += score
+                    if score > cell[HIGH]:
+                        cell[HIGH] = score
+
+    def add(self, pair, timestamp, score):
+        """ Count a new session """
+        self._add(pair, bucket_keys(timestamp), score)
+
+    def replace(self, pair, timestamp, old_score, score, history):
+        """
+            A session's score was changed from old_score to score.
+            history is the pair's ScoreHistory with the new score already in it.
+        """
+        tables = self.pairs[pair]
+        for resolution, key in zip(RESOLUTIONS, bucket_keys(timestamp)):
+            cell = tables[resolution][key]
+            overall = self.overall[resolution][key]
+            cell[TOTAL] += score - old_score
+            overall[TOTAL] += score - old_score
+            if score >= old_score:
+                cell[HIGH] = max(cell[HIGH], score)
+                overall[HIGH] = max(overall[HIGH], score)
+            else:
+                # The old score might have been the best so look again
+                cell[HIGH] = history.high(bucket_start(resolution, key), bucket_start(resolution, _next(resolution, key)))
+                overall[HIGH] = max(other[resolution][key][HIGH] for other in self.pairs.values() if key in other[resolution])
+
+    def series(self, resolution, pair=None, t0=None, t1=None):
+        """
+            Returns a list of (bucket start timestamp, count, high, mean, total) sorted by time
+            for one pair or all pairs (pair=None), for the buckets that start in [t0, t1).
+        """
+        if pair is None:
+            table = self.overall[resolution]
+        else:
+            tables = self.pairs.get(pair)
+            if tables is None:
+                return []
+            table = tables[resolution]
+        rows = []
+        for key in sorted(table):
+            start = bucket_start(resolution, key)
+            if (t0 is not None and start < t0) or (t1 is not None and start >= t1):
+                continue
+            count, high, total = table[key]
+            rows.append((start, count, high, total / count, total))
+        return rows
+
+    def to_json(self, sep="&"):
+        """ Copy of the totals as something json.dump can write """
+        def tables(resolutions):
+            return {resolution: [[key, *cell] for key, cell in resolutions[resolution].items()] for resolution in RESOLUTIONS}
+        return {
+            "overall": tables(self.overall),
+            "pairs": {sep.join(pair): tables(resolutions) for pair, resolutions in self.pairs.items()},
+        }
+
+    @classmethod
+    def from_json(cls, saved, sep="&"):
+        def tables(resolutions):
+            return {resolution: {key: cell for key, *cell in resolutions[resolution]} for resolution in RESOLUTIONS}
+        rollups = cls()
+        rollups.overall = tables(saved["overall"])
+        rollups.pairs = {tuple(pair.split(sep)): tables(resolutions) for pair, resolutions in saved["pairs"].items()}
+        return rollups
+
+
+def fingerprint(save_file):
+    """ Size and modification time of the save file, or None if it doesn't exist """
+    try:
+        stat = os.stat(save_file)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load(file, save_file, sep="&"):
+    """ Read the rollups saved for save_file. Returns None if there aren't any or they are out of date """
+    try:
+        with open(file) as rollup_file:
+            saved = json.load(rollup_file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if saved.get("version") != VERSION or saved.get("fingerprint") != fingerprint(save_file):
+        return None
+    return Rollups.from_json(saved["rollups"], sep)
+
+
+def save(file, saved_rollups, save_fingerprint):
+    """
+        Write what Rollups.to_json returned to a temporary file next to file.
+        Returns the temporary file so the caller can rename it when the time is right.
+    """
+    temp_file = f"{file}.{threading.get_ident()}.tmp"
+    with open(temp_file, "w") as rollup_file:
+        json.dump({"version": VERSION, "fingerprint": save_fingerprint, "rollups": saved_rollups},
+                  rollup_file, separators=(",", ":"))
+    return temp_file
@@ -0,0 +1,156 @@
+"""
+    Weighted random selection of chord pairs.
+
+    Every pair gets a weight and the weights are kept in a Fenwick tree
+    (binary indexed tree) so changing one weight and drawing a pair are both
+    O(log n) instead of scanning every pair.
+"""
+import random
+import time
+
+
+class FenwickTree:
+    """
+        Prefix sums over a growing list of weights.
+        Index 0 of self._tree is unused so the bit tricks work.
+    """
+
+    def __init__(self, weights=()):
+        # Building all at once is O(n): each node passes its sum up to its parent
+        self._weights = list(weights)
+        self._tree = [0.0] + self._weights
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._weights)
+
+    def prefix(self, count):
+        """ Sum of the first count weights """
+        total = 0.0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    @property
+    def total(self):
+        return self.prefix(len(self._weights))
+
+    def append(self, weight):
+        i = len(self._weights) + 1
+        # Node i covers the weights (i - lowbit(i), i]
+        self._tree.append(weight + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+        self._weights.append(weight)
+
+    def __getitem__(self, index):
+        return self._weights[index]
+
+    def __setitem__(self, index, weight):
+        change = weight - self._weights[index]
+        self._weights[index] = weight
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += change
+            i += i & -i
+
+    def find(self, value):
+        """
+            Returns the index of the weight that value falls into if all of
+            the weights were laid end to end.
+        """
+        position = 0
+        step = 1 << (len(self._weights).bit_length())
+        while step:
+            if position + step < len(self._tree) and self._tree[position + step] <= value:
+                position += step
+                value -= self._tree[position]
+            step >>= 1
+        # Rounding can push value past the end of the last weight
+        return min(position, len(self._weights) - 1)
+
+
+def highscore_weight(offset=5):
+    """
+        Lower high scores are more likely.
+
+        The old rejection loop in ChordData.weighted_random accepted a pair with a
+        probability of (target + 1) / (high + offset + 1) so this gives the same odds.
+    """
+    def weight(stats):
+        return 1 / (stats.high + offset + 1)
+    weight.offset = offset
+    return weight
+
+
+def average_weight(offset=5):
+    """ Lower average scores are more likely """
+    def weight(stats):
+        return 1 / (stats.average + offset + 1)
+    weight.offset = offset
+    return weight
+
+
+def recency_weight(half_life=7 * 24 * 60 * 60, offset=5, epoch=None):
+    """
+        Lower high scores are more likely, and a pair's weight doubles every
+        half_life seconds since it was last played.
+
+        Because the weight grows exponentially the ratio between two pairs does not
+        change as time passes, so the weights never need to be recomputed just
+        because the clock moved. epoch is only there to keep the numbers small.
+    """
+    if epoch is None:
+        epoch = time.time()
+
+    def weight(stats):
+        # Pairs that were never played count as played at epoch
+        last = epoch if stats.last is None else stats.last
+        exponent = min((epoch - last) / half_life, 512)
+        return 2 ** exponent / (stats.high + offset + 1)
+    weight.offset = offset
+    return weight
+
+
+class PairSampler:
+    """
+        Keeps one weight per chord pair and draws pairs in proportion to them.
+        Pairs are numbered 0, 1, 2 ... in the order they are added, which is the
+        same as their triangular index in ChordData.
+
+        weight is a function that takes a chorddata.PairStats and returns a number.
+        seed makes the draws repeatable.
+    """
+
+    def __init__(self, weight=None, seed=None, stats=()):
+        if weight is None:
+            weight = highscore_weight()
+        self.weight = weight
+        self.rng = random.Random(seed)
+        self._tree = FenwickTree(self.weight(pair_stats) for pair_stats in stats)
+
+    def __len__(self):
+        return len(self._tree)
+
+    def add(self, stats):
+        """ Add the next pair and return its index """
+        self._tree.append(self.weight(stats))
+        return len(self._tree) - 1
+
+    def update(self, index, stats):
+        self._tree[index] = self.weight(stats)
+
+    def draw(self):
+        """ Returns the index of a randomly chosen pair """
+        if not len(self._tree):
+            raise IndexError("Cannot draw from an empty sampler")
+        return self._tree.find(self.rng.random() * self._tree.total)
+
+    def draw_many(self, count):
+        """ Draw count pair indexes (with replacement) """
+        if not len(self._tree):
+            raise IndexError("Cannot draw from an empty sampler")
+        total = self._tree.total
+        return [self._tree.find(self.rng.random() * total) for _ in range(count)]
@@ -0,0 +1,166 @@
+"""
+    Spaced repetition for chord pairs.
+
+    Each pair gets a time it is due to be practiced again, worked out with the
+    SM-2 algorithm (the one SuperMemo and Anki started from): a pair that keeps
+    going well is asked for less and less often, one that goes badly is due again
+    the next day.
+
+    SM-2 wants a 0 - 5 grade for every review. A chord change score doesn't
+    mean much on its own, so the grade comes from comparing it to how the pair
+    has been going: beating the high score is a 5, keeping up with the recent
+    average is a 4, a small drop is a 3 and anything worse counts as a failed review.
+
+    Pairs are numbered by their index (see chorddata.triangular_index). The due
+    times are kept in a heap, so the next pair and every pair that is due can be
+    found without looking at all of them.
+"""
+import heapq
+import time
+
+DAY = 24 * 60 * 60
+START_EASE = 2.5
+MIN_EASE = 1.3
+# How much each new score moves the recent average
+AVERAGE_WEIGHT = 0.3
+
+
+class ReviewState:
+    """ SM-2 state of one pair that has been played """
+    __slots__ = ("interval", "ease", "repetitions", "average", "high", "due")
+
+    def __init__(self):
+        self.interval = 0.0
+        self.ease = START_EASE
+        self.repetitions = 0
+        self.average = None
+        self.high = 0
+        self.due = 0.0
+
+    def grade(self, score):
+        """ The SM-2 grade (0 - 5) for a new score """
+        if self.average is None:
+            # Nothing to compare the first session to
+            return 3
+        if score > self.high:
+            return 5
+        if score >= self.average:
+            return 4
+        if score >= self.average * 0.8:
+            return 3
+        if score >= self.average * 0.5:
+            return 2
+        return 1
+
+    def review(self, timestamp, score):
+        quality = self.grade(score)
+        if quality < 3:
+            self.repetitions = 0
+            self.interval = 1
+        else:
+            self.repetitions += 1
+            if self.repetitions == 1:
+                self.interval = 1
+            elif self.repetitions == 2:
+                self.interval = 6
+            else:
+                self.interval = self.interval * self.ease
+        self.ease = max(MIN_EASE, self.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        self.average = score if self.average is None else self.average + AVERAGE_WEIGHT * (score - self.average)
+        self.high = max(self.high, score)
+        self.due = timestamp + self.interval * DAY
+
+
+class Scheduler:
+    """
+        Due times for pairs 0 to n - 1. Pairs that were never played are due
+        right away (at time 0), so new pairs come up before old ones.
+
+        The heap holds (due, index) entries. Changing a pair's due time pushes a
+        new entry and leaves the old one in the heap; old entries are skipped
+        when they reach the top and the heap is rebuilt if too many pile up.
+    """
+
+    def __init__(self, histories=()):
+        """ histories has the ScoreHistory (or None if never played) of each pair in index order """
+        self.states = []
+        self.heap = []
+        for history in histories:
+            self.add(history)
+
+    def __len__(self):
+        return len(self.states)
+
+    def _state(self, history):
+        if not history:
+            return None
+        state = ReviewState()
+        for timestamp, score in history.items():
+            state.review(timestamp, score)
+        return state
+
+    def _push(self, index):
+        heapq.heappush(self.heap, (self.due_time(index), index))
+        if len(self.heap) > 2 * len(self.states) + 64:
+            self.heap = [(self.due_time(index), index) for index in range(len(self.states))]
+            heapq.heapify(self.heap)
+
+    def add(self, history=None):
+        """ Add the next pair and return its index """
+        self.states.append(self._state(history))
+        index = len(self.states) - 1
+        self._push(index)
+        return index
+
+    def update(self, index, timestamp, score):
+        """ A new session that is newer than every other session of the pair """
+        if self.states[index] is None:
+            self.states[index] = ReviewState()
+        self.states[index].review(timestamp, score)
+        self._push(index)
+
+    def reset(self, index, history):
+        """ Start the pair over from its whole history (for sessions that were changed or added out of order) """
+        self.states[index] = self._state(history)
+        self._push(index)
+
+    def due_time(self, index):
+        state = self.states[index]
+        return 0.0 if state is None else state.due
+
+    def _clean_top(self):
+        while self.heap and self.heap[0][0] != self.due_time(self.heap[0][1]):
+            heapq.heappop(self.heap)
+
+    def next_due(self):
+        """ Returns (index, due time) of the pair that is due soonest """
+        self._clean_top()
+        if not self.heap:
+            raise IndexError("There are no pairs to schedule")
+        due, index = self.heap[0]
+        return index, due
+
+    def due(self, now=None):
+        """
+            Returns [(index, due time)] for every pair that is due by now, soonest first.
+            Only the part of the heap that is due gets looked at.
+        """
+        if now is None:
+            now = time.time()
+        found = []
+        seen = set()
+        stack = [0] if self.heap else []
+        while stack:
+            position = stack.pop()
+            due, index = self.heap[position]
+            if due > now:
+                # Everything below this entry is due even later
+                continue
+            if index not in seen and due == self.due_time(index):
+                seen.add(index)
+                found.append((index, due))
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(self.heap):
+                    stack.append(child)
+        found.sort(key=lambda item: item[1])
+        return found
@@ -0,0 +1,315 @@
+"""
+    HTTP/JSON service that hosts the profiles of many players.
+
+    Each profile is a ChordData save file named <profile>.txt in the profile
+    directory. Profiles are loaded when they are first asked for and kept in
+    an LRU cache. When the cache is full the least recently used profile is
+    saved and closed. ChordData runs in journal mode so every change is on disk
+    as soon as the request returns, and dirty profiles are saved in a thread
+    every few seconds so the journals stay small.
+
+    Reads are answered straight from memory. Changes to a profile go through
+    that profile's write lock, so they happen one at a time and never while it
+    is being saved and closed.
+
+        GET  /profiles/<profile>                       chords and number of pairs
+        GET  /profiles/<profile>/stats?a=A&b=B         high, average, count, first, last, due
+        GET  /profiles/<profile>/random
+        GET  /profiles/<profile>/weighted
+        GET  /profiles/<profile>/next-due
+        POST /profiles/<profile>/chords    {"chords": ["A", "Bm"]}
+        POST /profiles/<profile>/scores    {"pair": ["A", "Bm"], "score": 30, "timestamp": 1700000000}
+
+    Usage:
+        python service.py --dir profiles --port 8765
+"""
+import argparse
+import asyncio
+from collections import OrderedDict
+import json
+import os
+import re
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+from chorddata import ChordData
+from history import MAX_SCORE
+
+PROFILE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+MAX_BODY = 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def check_pair(pair):
+    """ Returns pair as a tuple if it is two different chord names, 400 otherwise """
+    if (not isinstance(pair, (list, tuple)) or len(pair) != 2
+            or not all(isinstance(chord, str) and chord for chord in pair) or pair[0] == pair[1]):
+        raise HTTPError(400, "A pair has to be two different chords")
+    return tuple(pair)
+
+
+def is_number(value):
+    # bool is an int too but true isn't a score
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Profile:
+    """ A loaded profile and the lock its changes go through """
+
+    def __init__(self, data):
+        self.data = data
+        self.write_lock = asyncio.Lock()
+        # Set once the profile was evicted, a request still holding it has to get it again
+        self.closed = False
+
+
+class ProfileCache:
+    """
+        LRU cache of loaded profiles.
+        Loading, saving and closing a profile happen in a thread so the event loop keeps serving.
+    """
+
+    def __init__(self, directory, size=64):
+        self.directory = directory
+        self.size = size
+        self.profiles = OrderedDict()
+        self._loading = {}
+        self._closing = {}
+
+    def file(self, name):
+        if not PROFILE_NAME.match(name):
+            raise HTTPError(400, f"Bad profile name {name!r}")
+        return os.path.join(self.directory, name + ".txt")
+
+    async def get(self, name):
+        """ Returns the Profile for name, loading it if needed """
+        while True:
+            profile = self.profiles.get(name)
+            if profile is not None:
+                self.profiles.move_to_end(name)
+                return profile
+            if name in self._closing:
+                # Wait until the old copy is saved before reading the file again
+                await self._closing[name]
+                continue
+            if name not in self._loading:
+                self._loading[name] = asyncio.ensure_future(self._load(name))
+            return await asyncio.shield(self._loading[name])
+
+    async def _load(self, name):
+        try:
+            data = await asyncio.to_thread(ChordData, self.file(name), journal=True, journal_limit=float("inf"))
+            profile = self.profiles[name] = Profile(data)
+        finally:
+            del self._loading[name]
+        while len(self.profiles) > self.size:
+            old_name, old_profile = self.profiles.popitem(last=False)
+            self._closing[old_name] = asyncio.ensure_future(self._close(old_name, old_profile))
+        return profile
+
+    async def _close(self, name, profile):
+        """ Save and close an evicted profile once the changes already going are done """
+        try:
+            async with profile.write_lock:
+                profile.closed = True
+                await asyncio.to_thread(self._flush_and_close, profile.data)
+        finally:
+            del self._closing[name]
+
+    @staticmethod
+    def _flush_and_close(data):
+        if data.dirty:
+            data.compact()
+        data._close_journal()
+
+    async def flush(self):
+        """
+            Save every profile that changed since it was last saved.
+            Each save holds the profile's write lock, so it can't run while the
+            profile is being closed or after it was evicted (its journal may already
+            belong to a newly loaded copy).
+        """
+        for profile in list(self.profiles.values()):
+            async with profile.write_lock:
+                if not profile.closed and profile.data.dirty:
+                    await asyncio.to_thread(profile.data._save)
+
+    async def close(self):
+        while self.profiles:
+            name, profile = self.profiles.popitem(last=False)
+            self._closing[name] = asyncio.ensure_future(self._close(name, profile))
+        await asyncio.gather(*self._closing.values())
+
+
+class PracticeService:
+
+    def __init__(self, cache, flush_interval=5.0):
+        self.cache = cache
+        self.flush_interval = flush_interval
+
+    async def write(self, name, change):
+        """ Run change(data) with the profile's write lock held """
+        while True:
+            profile = await self.cache.get(name)
+            async with profile.write_lock:
+                if not profile.closed:
+                    return change(profile.data)
+
+    async def handle(self, method, path, query, body):
+        """ Returns the JSON response for a request """
+        parts = path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] != "profiles":
+            raise HTTPError(404, f"No such resource {path}")
+        name = parts[1]
+        action = parts[2] if len(parts) > 2 else ""
+        if method == "GET":
+            data = (await self.cache.get(name)).data
+            if action == "":
+                return {"chords": data.chords, "pairs": data.pair_count}
+            if data.pair_count == 0 and action in ("random", "weighted", "next-due"):
+                raise HTTPError(404, "The profile has no chord pairs yet")
+            if action == "stats":
+                pair = check_pair((query.get("a", [""])[0], query.get("b", [""])[0]))
+                try:
+                    stats = data.stats(pair)
+                    due = data.due_time(pair)
+                except KeyError:
+                    raise HTTPError(404, f"Unknown pair {pair}") from None
+                return {"pair": list(data.pair_at(data.pair_index(pair))), "high": stats.high, "average": stats.average,
+                        "count": stats.count, "first": stats.first, "last": stats.last, "due": due}
+            if action == "random":
+                return {"pair": list(data.random_key())}
+            if action == "weighted":
+                return {"pair": list(data.weighted_random())}
+            if action == "next-due":
+                return {"pair": list(data.next_due())}
+        elif method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "The body is not JSON") from None
+            if not isinstance(request, dict):
+                raise HTTPError(400, "The body has to be a JSON object")
+            if action == "chords":
+                chords = request.get("chords", [])
+                if not isinstance(chords, list) or not all(isinstance(chord, str) for chord in chords):
+                    raise HTTPError(400, "chords must be a list of strings")
+                added, known, invalid = await self.write(name, lambda data: data.add_chords(chords))
+                return {"added": added, "known": known, "invalid": invalid}
+            if action == "scores":
+                pair = check_pair(request.get("pair"))
+                score, timestamp = request.get("score"), request.get("timestamp")
+                if (not isinstance(score, int) or isinstance(score, bool) or not 0 <= score <= MAX_SCORE
+                        or not (timestamp is None or is_number(timestamp))):
+                    raise HTTPError(400, "Expected {\"pair\": [a, b], \"score\": int, \"timestamp\": optional number}")
+                try:
+                    await self.write(name, lambda data: data.add_score(pair, score, timestamp))
+                except IndexError:
+                    raise HTTPError(404, f"Unknown pair {list(pair)}") from None
+                except (TypeError, ValueError) as error:
+                    raise HTTPError(400, str(error)) from None
+                return {"ok": True}
+        else:
+            raise HTTPError(405, f"{method} is not supported")
+        raise HTTPError(404, f"No such resource {path}")
+
+    async def serve_client(self, reader, writer):
+        """ Handles requests on one connection until the client closes it (HTTP/1.1 keep alive) """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    try:
+                        length = int(headers.get("content-length", 0) or 0)
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        # Without a length the body can't be skipped, so the connection has to close
+                        keep_alive = False
+                        raise HTTPError(400, "Bad Content-Length")
+                    if length > MAX_BODY:
+                        raise HTTPError(413, "Request body too large")
+                    body = await reader.readexactly(length) if length else b""
+                    url = urlsplit(target)
+                    status, response = 200, await self.handle(method, url.path, parse_qs(url.query), body)
+                except HTTPError as error:
+                    status, response = error.status, {"error": error.message}
+                    keep_alive = keep_alive and error.status != 413
+                except Exception as error:
+                    print(f"Error handling {method} {target}: {error!r}", file=sys.stderr)
+                    status, response = 500, {"error": "Internal error"}
+                payload = json.dumps(response).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.cache.flush()
+
+
+async def serve(directory, host="127.0.0.1", port=8765, cache_size=64, flush_interval=5.0):
+    os.makedirs(directory, exist_ok=True)
+    cache = ProfileCache(os.path.abspath(directory), cache_size)
+    service = PracticeService(cache, flush_interval)
+    server = await asyncio.start_server(service.serve_client, host, port)
+    flusher = asyncio.ensure_future(service.flush_periodically())
+    print(f"Serving profiles from {cache.directory} on http://{host}:{port}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        flusher.cancel()
+        await cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many ChordData profiles over HTTP")
+    parser.add_argument("--dir", default="profiles", help="directory with one <profile>.txt per player")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=64, help="most profiles kept in memory at once")
+    parser.add_argument("--flush-interval", type=float, default=5.0, help="seconds between saves of changed profiles")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.dir, args.host, args.port, args.cache_size, args.flush_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,89 @@
 """ Screen for the Guitar Suite that shows the user some stats
     about their progress and lets them enter chords they have learned. """
 
-from PyQt5.QtCore import Qt, pyqtSignal, QVariant
-from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QGridLayout, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QLineEdit
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QGridLayout, QVBoxLayout, QHBoxLayout, QTableView, QLineEdit
 from chordbuilder import ChordBuilder
+from historychart import HistoryChart
+import instrument
 import time
 from datetime import datetime
 
+# The proxy sorts on this role so numbers and dates sort as numbers instead of strings
+SortRole = Qt.UserRole
+
+
+class StatsTableModel(QAbstractTableModel):
+    """
+        Table with one row per chord pair: the pair, high score, average score and last played date.
+
+        The cells are read from the ChordData object when the view asks for them.
+        The model listens to the ChordData object so adding a score only updates
+        that pair's row and adding a chord only inserts the new pairs.
+    """
+
+    headers = ["Chord Pair", "High Score", "Average Score", "Last Played"]
+
+    def __init__(self, data, *args, **kwargs):
+        super(StatsTableModel, self).__init__(*args, **kwargs)
+        # Not self.data, that would hide QAbstractTableModel.data
+        self.chord_data = data
+        self.pairs = list(data.pairs())
+        self.rows = {pair: row for row, pair in enumerate(self.pairs)}
+        data.add_listener(self.data_changed)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.pairs)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super(StatsTableModel, self).headerData(section, orientation, role)
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, SortRole):
+            return None
+        pair = self.pairs[index.row()]
+        column = index.column()
+        if column == 0:
+            return ", ".join(pair)
+        stats = self.chord_data.stats(pair)
+        if column == 1:
+            return stats.high
+        elif column == 2:
+            return stats.average
+        if role == SortRole:
+            return stats.last or 0.0
+        if stats.last is None:
+            return "Never"
+        return datetime.fromtimestamp(stats.last).strftime("%y/%m/%d")
+
+    def data_changed(self, event, *args):
+        """ Listener for the ChordData object """
+        if event == "score":
+            row = self.rows[args[0]]
+            self.dataChanged.emit(self.index(row, 1), self.index(row, len(self.headers) - 1))
+        elif event == "chord":
+            new_pairs = args[1]
+            if not new_pairs:
+                return
+            first = len(self.pairs)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_pairs) - 1)
+            for row, pair in enumerate(new_pairs, first):
+                self.pairs.append(pair)
+                self.rows[pair] = row
+            self.endInsertRows()
+
 class UserProgress(QWidget):
 
     def __init__(self, data, *args, **kwargs):
@@ -38,15 +115,24 @@ class UserProgress(QWidget):
 
         table_label = QLabel("60 Second Chord Change Stats")
         table_label.setProperty("font-class", "h3")
-        self.stats_table = QTableWidget(self)
-        self.stats_table.setSortingEnabled(True)
+        self.stats_model = None
+        self.stats_table = QTableView(self)
         self.stats_table.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-
-        self.stats_table.setColumnCount(4)
-        self.stats_table.setHorizontalHeaderLabels(["Chord Pair", "High Score", "Average Score", "Last Played"])
+        self.stats_table.verticalHeader().hide()
         self.stats_table.setMinimumWidth(450)
         self.stats_table.setMaximumWidth(450)
 
+        # Click a row in the table to see that pair's history
+        self.chart_label = QLabel()
+        self.chart_label.setProperty("font-class", "h3")
+        self.history_chart = HistoryChart(data)
+        self.history_chart.setMinimumWidth(450)
+        self.all_pairs_button = QPushButton("All Pairs")
+        self.all_pairs_button.clicked.connect(self.show_all_pairs)
+        chart_header = QHBoxLayout()
+        chart_header.addWidget(self.chart_label)
+        chart_header.addWidget(self.all_pairs_button)
+
         #self.grid.addWidget(known_chords, 0, 0, 1, 2)
         #self.grid.addWidget(self.chord_container, 1, 0, 1, 2)
         #self.grid.addWidget(self.instructions, 2, 0, 1, 2)
@@ -62,6 +148,8 @@ class UserProgress(QWidget):
         self.chord_vbox.setAlignment(Qt.AlignTop)
         self.stats_vbox.addWidget(table_label)
         self.stats_vbox.addWidget(self.stats_table)
+        self.stats_vbox.addLayout(chart_header)
+        self.stats_vbox.addWidget(self.history_chart)
         self.stats_vbox.setAlignment(Qt.AlignTop)
 
         self.grid.addWidget(self.chord_side)
@@ -71,6 +159,7 @@ class UserProgress(QWidget):
         self.init_chords()
         self.display_chords()
         self.display_stats()
+        self.show_all_pairs()
 
     def init_chords(self):
         self.chord_dict = {}
@@ -88,33 +177,33 @@ class UserProgress(QWidget):
             r, c = count // num_cols, count % num_cols
             self.chord_grid.addWidget(chord_label, r, c)
 
-    def clear_stats(self):
-        for r in range(self.stats_table.rowCount()):
-            for c in range(self.stats_table.columnCount()):
-                self.stats_table.item(r, c).setParent(None)
+    def display_stats(self):
+        """
+            Hooks the stats table up to the data the first time it is called.
+            After that the model keeps itself up to date so there is nothing to do.
+        """
+        if self.stats_model is not None:
+            return
+        self.stats_model = StatsTableModel(self.data, self)
+        self.stats_proxy = QSortFilterProxyModel(self)
+        self.stats_proxy.setSourceModel(self.stats_model)
+        self.stats_proxy.setSortRole(SortRole)
+        self.stats_table.setModel(self.stats_proxy)
+        self.stats_table.setSortingEnabled(True)
+        self.stats_table.sortByColumn(-1, Qt.AscendingOrder)
+        self.stats_table.clicked.connect(self.show_pair_history)
 
+    def show_pair_history(self, index):
+        """ Chart the sessions of the pair in the row that was clicked """
+        pair = self.stats_model.pairs[self.stats_proxy.mapToSource(index).row()]
+        self.chart_label.setText(f"History: {' + '.join(pair)}")
+        self.all_pairs_button.setEnabled(True)
+        self.history_chart.set_pair(pair)
 
-    def display_stats(self):
-        self.stats_table.setRowCount(len(self.data.scores))
-        for count, pair in enumerate(self.data.scores):
-            key = QTableWidgetItem(", ".join(pair))
-            key.setFlags(Qt.ItemIsEnabled)
-            # The table items that hold integers (high and avg) use QVariant(int)
-            # and the Qt.EditRole (or Qt.DisplayRole, they are the same for TableWidgetItem.setData())
-            # to display and sort the values as integers instead of strings.
-            high = QTableWidgetItem()
-            high.setData(Qt.EditRole, QVariant(self.data.highscore(pair)))
-            high.setFlags(Qt.ItemIsEnabled)
-            avg = QTableWidgetItem()
-            avg.setData(Qt.EditRole, QVariant(self.data.avgscore(pair)))
-            avg.setFlags(Qt.ItemIsEnabled)
-            latest_time = sorted(list(self.data.scores[pair].keys()))[-1]
-            recent = QTableWidgetItem(datetime.fromtimestamp(latest_time).strftime("%y/%m/%d"))
-            recent.setFlags(Qt.ItemIsEnabled)
-            self.stats_table.setItem(count, 0, key)
-            self.stats_table.setItem(count, 1, high)
-            self.stats_table.setItem(count, 2, avg)
-            self.stats_table.setItem(count, 3, recent)
+    def show_all_pairs(self):
+        self.chart_label.setText("History: Best and Average by Day")
+        self.all_pairs_button.setEnabled(False)
+        self.history_chart.set_pair(None)
 
     def update_chords(self):
         self.clear_chords()
@@ -131,7 +220,6 @@ class UserProgress(QWidget):
             chord_button.setProperty("id", "chord-button")
             self.chord_dict[chord_added] = chord_button
             self.update_chords()
-            self.display_stats()
             self.instructions.setText(f"'{chord}' added.")
         elif chord_added == False:
             self.instructions.setText(f"'{chord}' was not added. It is already known.")
@@ -139,6 +227,9 @@ class UserProgress(QWidget):
             self.instructions.setText(f"'{chord}' was not added. It could not be validated.")
 
 
+instrument.watch(UserProgress, "display_stats")
+
+
 if __name__ == "__main__":
     from PyQt5.QtWidgets import QApplication
     from chorddata import ChordData
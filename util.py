@@ -1,6 +1,10 @@
 """ module that I will use to store variables that
     should probably be settings in a config file or something.
 """
+from bisect import bisect_left
+from functools import lru_cache
+import json
+import os
 
 # Variables so I can just address the score thresholds by a name
 bad = 10
@@ -11,15 +15,100 @@ good = 50
 great = 60
 mastery = 100
 
-# Dict containing scores and colors for them
-# Chord Pair Buttons will be colored according to the
-# highest key they are lower than.
-COLOR_DICT = {
-        10: "#9d2424", # Bad
-        20: "#d0521d", # Poor
-        30: "#ea8d00", # Okay
-        40: "#e1a500", # Decent
-        50: "#94a500", # Good
-        60: "#88b03a", # Great
-        1000: "#229933" # Mastery
+# Chord pair buttons are put in the bucket of the lowest threshold their
+# high score is less than or equal to. The bucket name is set as the button's
+# "bucket" property and the stylesheet rules that color them are made from
+# BUCKET_COLORS (see app_stylesheet).
+# The thresholds and colors can be changed with a settings file (see load_settings)
+BUCKETS = {
+        "bad": 10,
+        "poor": 20,
+        "okay": 30,
+        "decent": 40,
+        "good": 50,
+        "great": 60,
+        "mastery": 1000,
     }
+
+# The only place the bucket colors are set. Both the buttons and the views
+# that paint pairs themselves (pairview.VirtualPairGrid) use these.
+BUCKET_COLORS = {
+        "bad": "#9d2424",
+        "poor": "#d0521d",
+        "okay": "#ea8d00",
+        "decent": "#e1a500",
+        "good": "#94a500",
+        "great": "#88b03a",
+        "mastery": "#229933",
+    }
+
+_thresholds = []
+_bucket_names = []
+
+
+def set_thresholds(buckets):
+    """ Takes a dict of bucket name -> highest score in that bucket """
+    global _thresholds, _bucket_names
+    ordered = sorted(buckets.items(), key=lambda item: item[1])
+    _thresholds = [threshold for name, threshold in ordered]
+    _bucket_names = [name for name, threshold in ordered]
+
+
+def score_bucket(score):
+    """ Returns the name of the bucket a score is in, or '' if it is above every threshold """
+    i = bisect_left(_thresholds, score)
+    if i < len(_bucket_names):
+        return _bucket_names[i]
+    return ""
+
+
+def bucket_color(score):
+    return BUCKET_COLORS.get(score_bucket(score))
+
+
+def load_settings(file):
+    """
+        Read settings from a JSON file. Right now it has the thresholds and colors:
+            {"thresholds": {"bad": 5, "poor": 15, ...}, "colors": {"bad": "#ff0000", ...}}
+        Buckets that are left out keep their default threshold and color.
+    """
+    with open(file) as settings_file:
+        settings = json.load(settings_file)
+    if "thresholds" in settings:
+        BUCKETS.update(settings["thresholds"])
+        set_thresholds(BUCKETS)
+    if "colors" in settings:
+        BUCKET_COLORS.update(settings["colors"])
+
+
+set_thresholds(BUCKETS)
+if os.environ.get("GUITARSUITE_SETTINGS"):
+    load_settings(os.environ["GUITARSUITE_SETTINGS"])
+
+
+@lru_cache(maxsize=None)
+def stylesheet(name):
+    """
+        Returns the contents of a .qss file that is next to this module.
+        Files are only read once.
+    """
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name)) as styles:
+        return styles.read()
+
+
+def bucket_styles():
+    """ Stylesheet rules that give the pair buttons in each bucket their color """
+    return "".join(
+        f"QPushButton[type=pairbutton][bucket={name}] {{ background-color: {color}; }}\n"
+        for name, color in BUCKET_COLORS.items()
+    )
+
+
+def app_stylesheet():
+    """ guitarsuite_styles.qss with the bucket colors added """
+    return stylesheet("guitarsuite_styles.qss") + bucket_styles()
+
+
+# Once there are more chord pairs than this the chord changes screen uses
+# pairview.VirtualPairGrid instead of making a button for every pair
+VIRTUAL_GRID_THRESHOLD = 1000